@@ -0,0 +1,139 @@
+"""Minimal bencode decoder and .torrent metadata helpers."""
+
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+
+class BencodeError(ValueError):
+    """Raised for data that is not valid bencode."""
+
+
+def _decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    """Decode one value starting at pos, return (value, end position)."""
+    try:
+        token = data[pos : pos + 1]
+        if token == b"i":
+            end = data.index(b"e", pos)
+            return int(data[pos + 1 : end]), end + 1
+        if token == b"l":
+            pos += 1
+            items = []
+            while data[pos : pos + 1] != b"e":
+                item, pos = _decode(data, pos)
+                items.append(item)
+            return items, pos + 1
+        if token == b"d":
+            pos += 1
+            result = {}
+            while data[pos : pos + 1] != b"e":
+                key, pos = _decode(data, pos)
+                result[key], pos = _decode(data, pos)
+            return result, pos + 1
+        if token.isdigit():
+            colon = data.index(b":", pos)
+            length = int(data[pos:colon])
+            start = colon + 1
+            if start + length > len(data):
+                raise BencodeError("string exceeds data")
+            return data[start : start + length], start + length
+    except BencodeError:
+        raise
+    except (ValueError, IndexError):
+        raise BencodeError(f"invalid bencode at offset {pos}") from None
+
+    raise BencodeError(f"invalid bencode at offset {pos}")
+
+
+def decode(data: bytes) -> Any:
+    """
+    Decode bencoded data.
+
+    Args:
+        data: Bencoded bytes
+
+    Returns:
+        Decoded value (int, bytes, list or dict with bytes keys)
+
+    Raises:
+        BencodeError: If the data is not valid bencode
+    """
+    value, end = _decode(data, 0)
+    if end != len(data):
+        raise BencodeError("trailing data after bencoded value")
+    return value
+
+
+def _info_span(data: bytes) -> Tuple[int, int]:
+    """Find start and end offset of the raw info dictionary (for the info hash)."""
+    if data[:1] != b"d":
+        raise BencodeError("torrent is not a dictionary")
+    pos = 1
+    while data[pos : pos + 1] != b"e":
+        key, pos = _decode(data, pos)
+        start = pos
+        _, pos = _decode(data, pos)
+        if key == b"info":
+            return start, pos
+    raise BencodeError("torrent has no info dictionary")
+
+
+def _text(value: bytes) -> str:
+    return value.decode("utf-8", errors="replace")
+
+
+def torrent_info(data: bytes) -> Dict[str, Any]:
+    """
+    Read the relevant metadata from a .torrent file.
+
+    Args:
+        data: Raw .torrent file content
+
+    Returns:
+        Dict with keys:
+        - info_hash: hex SHA-1 of the info dictionary
+        - name: torrent name (file name or top directory)
+        - piece_length: bytes per piece
+        - pieces: list of 20-byte SHA-1 piece hashes
+        - files: list of (relative path, length); a single-file torrent has
+          one entry with the name as path
+        - total_length: sum of all file lengths in bytes
+        - multi_file: True if the torrent has a "files" list
+
+    Raises:
+        BencodeError: If the data is not a valid torrent
+    """
+    start, end = _info_span(data)
+    info = decode(data[start:end])
+
+    try:
+        name = _text(info[b"name"])
+        piece_length = info[b"piece length"]
+        raw_pieces = info[b"pieces"]
+        if b"files" in info:
+            files: List[Tuple[str, int]] = [
+                ("/".join(_text(part) for part in f[b"path"]), f[b"length"])
+                for f in info[b"files"]
+            ]
+            multi_file = True
+        else:
+            files = [(name, info[b"length"])]
+            multi_file = False
+    except (KeyError, TypeError) as e:
+        raise BencodeError(f"torrent info is missing {e}") from None
+
+    if not isinstance(piece_length, int) or piece_length <= 0:
+        raise BencodeError(f"torrent piece length must be positive, got {piece_length!r}")
+    if any(not isinstance(length, int) or length < 0 for _, length in files):
+        raise BencodeError("torrent has a file with an invalid length")
+    if not isinstance(raw_pieces, bytes) or len(raw_pieces) % 20:
+        raise BencodeError("torrent piece hashes have an invalid length")
+
+    return {
+        "info_hash": hashlib.sha1(data[start:end]).hexdigest(),
+        "name": name,
+        "piece_length": piece_length,
+        "pieces": [raw_pieces[i : i + 20] for i in range(0, len(raw_pieces), 20)],
+        "files": files,
+        "total_length": sum(length for _, length in files),
+        "multi_file": multi_file,
+    }
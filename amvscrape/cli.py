@@ -1,17 +1,33 @@
 """CLI argument parsing and command dispatch for amvscrape."""
 
 import argparse
+import sqlite3
 import sys
 from pathlib import Path
 
-from . import config, db, downloader, scraper
+from . import (
+    client,
+    config,
+    db,
+    downloader,
+    events,
+    library,
+    plan,
+    scraper,
+    selection,
+    snapshot,
+    store,
+    verify,
+    worker,
+)
 
 
 def cmd_scrape(args):
     """Scrape amvnews.ru for new AMVs."""
     max_pages = args.n
+    shard = parse_shard_arg(args.shard)
     try:
-        new_count = scraper.scrape_all(max_pages=max_pages)
+        new_count = scraper.scrape_all(max_pages=max_pages, shard=shard)
     except KeyboardInterrupt:
         print("\n\nScraping interrupted by user.")
         sys.exit(0)
@@ -20,176 +36,275 @@ def cmd_scrape(args):
         sys.exit(1)
 
 
+def parse_shard_arg(text):
+    """
+    Parse a --shard k/n argument, exiting with an error message if invalid.
+
+    Returns:
+        (k, n) tuple, or None if text is None
+    """
+    if text is None:
+        return None
+    try:
+        return selection.parse_shard(text)
+    except selection.SelectionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def compile_specs(specs, default_state=None, report_missing=True):
+    """
+    Compile selection specs to a WHERE clause (see amvscrape.selection).
+
+    Exits with an error message if a spec is not valid. Explicitly listed
+    IDs that are not in the database are reported as skipped.
+
+    Returns:
+        (where, params) tuple
+    """
+    try:
+        where, params = selection.compile_selection(specs, default_state)
+        ids = selection.explicit_ids(specs)
+    except selection.SelectionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if report_missing and ids:
+        for amv_id in db.find_missing_ids(ids):
+            print(f"  {amv_id} → not in database (skipped)")
+
+    return where, params
+
+
+def select_rows(specs, default_state=None, order="id", limit=None, report_missing=True):
+    """
+    Resolve selection specs to database rows, streamed in chunks.
+
+    See amvscrape.selection for the grammar. Exits with an error message if a
+    spec is not valid.
+
+    Args:
+        specs: Selection specs from the command line
+        default_state: State for ranges/thresholds (and the empty selection)
+            when no state filter is given
+        order: Row order (see db.ORDERS)
+        limit: Maximum number of rows, None for all
+        report_missing: Print explicit IDs that are not in the database
+
+    Returns:
+        Iterator over Row objects
+    """
+    where, params = compile_specs(specs, default_state, report_missing)
+    return db.iter_amvs(where, params, order=order, limit=limit)
+
+
+def parse_budget_arg(text):
+    """
+    Parse a --budget size argument (e.g. "500G"), exiting if invalid.
+
+    Returns:
+        Budget in MB, or None if text is None
+    """
+    if text is None:
+        return None
+    try:
+        return selection.parse_size_mb(text)
+    except selection.SelectionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def report_unknown_sizes(where, params):
+    """Print how many selected AMVs are left out of a budget for lack of a size."""
+    unknown = plan.count_unknown_sizes(where, params)
+    if unknown:
+        print(f"  {unknown} AMV(s) of unknown size left out of the budget")
+
+
+def print_events(iterable):
+    """
+    Print the events of one of the iter_* generators (see events.PrintSink).
+
+    Returns:
+        The last event (usually the summary), or None if there was none
+    """
+    event = None
+    for event in events.emit(iterable, events.PrintSink()):
+        pass
+    return event
+
+
 def cmd_download(args):
     """Download torrent files for AMVs."""
-    if args.id:
-        print(f"Downloading torrent for AMV ID: {args.id}")
-        if downloader.download_for_amv(args.id):
-            print(f"\n✓ Torrent for AMV {args.id} downloaded successfully")
-        else:
-            print(f"\n✗ Failed to download torrent for AMV {args.id}")
-            sys.exit(1)
-    else:
+    shard = parse_shard_arg(args.shard)
+
+    if not args.ids:
         print("Downloading torrents for all pending AMVs...")
-        count = downloader.download_all_pending()
+        count = downloader.download_all_pending(
+            shard=shard, order=args.order, limit=args.limit, fast=args.fast
+        )
         print(f"\n✓ Done! {count} torrents downloaded.")
+        return
 
+    specs = list(args.ids)
+    if args.shard:
+        specs.append(f"shard={args.shard}")
 
-def parse_id_range(range_spec):
-    """
-    Parse ID range specification.
+    where, params = compile_specs(specs, default_state=0)
+    total = db.count_amvs(where, params)
+    if args.limit is not None:
+        total = min(total, args.limit)
 
-    Supported formats:
-    - Single ID: "12345"
-    - Range: "8000-9000"
-    - Greater than: ">9000"
-    - Less than: "<500"
+    if not total:
+        print("No AMVs match the selection")
+        sys.exit(1)
 
-    Returns list of IDs from database matching the spec.
-    """
-    import re
-
-    # Check for range: 8000-9000
-    if "-" in range_spec and not range_spec.startswith("-"):
-        parts = range_spec.split("-")
-        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
-            start = int(parts[0])
-            end = int(parts[1])
-            with db.get_connection() as conn:
-                cursor = conn.execute(
-                    "SELECT id FROM amvs WHERE CAST(id AS INTEGER) >= ? AND CAST(id AS INTEGER) <= ? AND state=1",
-                    (start, end),
-                )
-                return [row["id"] for row in cursor.fetchall()]
-
-    # Check for greater than: >9000
-    if range_spec.startswith(">"):
-        value = range_spec[1:].strip()
-        if value.isdigit():
-            threshold = int(value)
-            with db.get_connection() as conn:
-                cursor = conn.execute(
-                    "SELECT id FROM amvs WHERE CAST(id AS INTEGER) > ? AND state=1",
-                    (threshold,),
-                )
-                return [row["id"] for row in cursor.fetchall()]
-
-    # Check for less than: <500
-    if range_spec.startswith("<"):
-        value = range_spec[1:].strip()
-        if value.isdigit():
-            threshold = int(value)
-            with db.get_connection() as conn:
-                cursor = conn.execute(
-                    "SELECT id FROM amvs WHERE CAST(id AS INTEGER) < ? AND state=1",
-                    (threshold,),
-                )
-                return [row["id"] for row in cursor.fetchall()]
-
-    # Single ID
-    return [range_spec]
+    print(f"Downloading torrents for {total} AMV(s)...")
 
+    rows = db.iter_amvs(where, params, order=args.order, limit=args.limit)
+    success_count = 0
+    for event in events.emit(
+        downloader.iter_download(rows, fast=args.fast), events.PrintSink()
+    ):
+        if isinstance(event, events.TorrentSaved):
+            success_count += 1
 
-def cmd_torrent(args):
-    """Send torrent files to deluge-gtk."""
-    import subprocess
+    if success_count == total:
+        print(f"\n✓ {success_count} torrent(s) downloaded successfully")
+    else:
+        print(f"\n✗ Downloaded {success_count}/{total} torrent(s)")
+        sys.exit(1)
 
-    torrent_files = []
-    processed_ids = []
 
+def cmd_enqueue(args):
+    """Add download jobs to the job queue."""
     if args.ids:
-        # Parse IDs and ranges
-        all_ids = []
-        for spec in args.ids:
-            parsed = parse_id_range(spec)
-            all_ids.extend(parsed)
-
-        # Remove duplicates while preserving order
-        seen = set()
-        input_ids = []
-        for amv_id in all_ids:
-            if amv_id not in seen:
-                seen.add(amv_id)
-                input_ids.append(amv_id)
-
-        print(f"Sending torrents for {len(input_ids)} AMV(s) to deluge-gtk...")
-
-        for amv_id in input_ids:
-            entry = db.get_by_id(amv_id)
-            if not entry:
-                print(f"  {amv_id} → not in database (skipped)")
-                continue
-
-            torrentfile = entry["torrentfile"]
-            if not torrentfile:
-                print(f"  {amv_id} → no torrent file available (skipped)")
-                continue
-
-            torrent_path = config.TORRENT_DIR / torrentfile
-            if not torrent_path.exists():
-                print(f"  {amv_id} → torrent file not found: {torrentfile}")
-                continue
-
-            torrent_files.append(torrent_path)
-            processed_ids.append(amv_id)
-            print(f"  {amv_id} → {torrentfile}")
+        specs = list(args.ids)
+        if args.shard:
+            specs.append(f"shard={args.shard}")
+        where, params = compile_specs(specs, default_state=0)
+        count = db.enqueue_jobs(where, params, order=args.order, limit=args.limit)
     else:
-        # No IDs provided - get all with state=1 (torrent ready)
-        print("Sending all pending torrents (state=1) to deluge-gtk...")
+        shard = parse_shard_arg(args.shard)
+        where, params = selection.shard_sql(*shard) if shard else ("1", [])
+        count = db.enqueue_jobs(
+            where, params, order=args.order, limit=args.limit, pending=True
+        )
 
-        pending = db.get_by_state(1)
-        if not pending:
-            print("No torrents ready to send (no AMVs with state=1)")
-            return
+    print(f"✓ {count} download job(s) queued")
 
-        print(f"Found {len(pending)} torrent(s) ready to send")
 
-        for entry in pending:
-            amv_id = entry["id"]
-            torrentfile = entry["torrentfile"]
+def cmd_worker(args):
+    """Process download jobs from the job queue."""
+    print(f"Worker {worker.worker_name()} started")
+    counts = worker.run_worker(wait=args.wait, limit=args.limit, fast=args.fast)
+    print(
+        f"\n✓ Done! {counts['done']} done, {counts['failed']} failed, "
+        f"{counts['lost']} lost"
+    )
 
-            if not torrentfile:
-                print(f"  {amv_id} → no torrent file (skipped)")
-                continue
 
-            torrent_path = config.TORRENT_DIR / torrentfile
-            if not torrent_path.exists():
-                print(f"  {amv_id} → file not found: {torrentfile}")
-                continue
+def cmd_jobs(args):
+    """Show the state of the job queue."""
+    counts = db.count_jobs()
+    for status in db.JOB_STATUSES:
+        line = f"  {status:>8}: {counts[status]}"
+        if status == "running" and counts["expired"]:
+            line += f" ({counts['expired']} with expired lease)"
+        print(line)
 
-            torrent_files.append(torrent_path)
-            processed_ids.append(amv_id)
-            print(f"  {amv_id} → {torrentfile}")
 
-    if not torrent_files:
-        print("\nNo valid torrent files to send")
-        return
+def cmd_recheck(args):
+    """Recheck downloaded AMVs for new or better torrents."""
+    reopen = args.reopen
 
-    # Convert to absolute paths (required by deluge-gtk)
-    abs_paths = [str(p.absolute()) for p in torrent_files]
+    if args.ids:
+        # Only AMVs that have been downloaded already
+        rows = select_rows(
+            list(args.ids) + ["state=1|2|3"], order="newest", limit=args.limit
+        )
+        count = downloader.recheck_entries(rows, reopen=reopen)
+    else:
+        count = downloader.recheck_due(limit=args.limit, reopen=reopen)
 
-    print(f"\nCalling deluge-gtk with {len(abs_paths)} torrent file(s)...")
+    print(f"\n✓ Done! {count} better torrents downloaded.")
 
-    try:
-        # Call deluge-gtk with all torrent files at once
-        cmd = [config.TORRENT_CLIENT_CMD] + abs_paths
-        subprocess.run(cmd, check=True)
 
-        # Update database: set state=2 for all sent torrents
-        for amv_id in processed_ids:
-            db.update_state(amv_id, 2)
+def cmd_torrent(args):
+    """Send torrent files to deluge-gtk."""
+    # Without IDs this selects everything with state=1 (torrent ready).
+    # Ranges/thresholds are limited to state=1 too, explicit IDs are sent
+    # regardless of their state.
+    where, params = compile_specs(args.ids, default_state=1)
+    rows = db.iter_amvs(where, params, order=args.order, limit=args.limit)
 
-        print(f"✓ Sent {len(torrent_files)} torrent(s) to deluge-gtk")
-        print(f"✓ Updated {len(processed_ids)} AMV(s) to state=2 (sent to client)")
+    budget_mb = parse_budget_arg(args.budget)
+    if budget_mb is not None:
+        plan.fill_total_bytes(where, params)
+        report_unknown_sizes(where, params)
+        rows = selection.limit_budget(rows, budget_mb)
 
-    except subprocess.CalledProcessError as e:
-        print(f"\n✗ Error calling deluge-gtk: {e}", file=sys.stderr)
-        sys.exit(1)
-    except FileNotFoundError:
-        print(f"\n✗ Error: {config.TORRENT_CLIENT_CMD} not found", file=sys.stderr)
-        print("Make sure deluge-gtk is installed on your system", file=sys.stderr)
+    send_torrents(rows, selected=bool(args.ids))
+
+
+def send_torrents(rows, selected):
+    """
+    Send the torrent files of the given AMVs to deluge-gtk (see client.iter_send).
+
+    Args:
+        rows: AMV rows (or an iterator over rows)
+        selected: True if the rows come from an explicit selection (only
+            changes the messages)
+    """
+    if selected:
+        print("Sending selected torrents to deluge-gtk...")
+    else:
+        print("Sending all pending torrents (state=1) to deluge-gtk...")
+
+    amv_count = 0
+    queued = 0
+    try:
+        for event in events.emit(client.iter_send(rows), events.PrintSink()):
+            if isinstance(event, (events.TorrentQueued, events.Skipped)):
+                amv_count += 1
+            if isinstance(event, events.TorrentQueued):
+                queued += 1
+    except client.ClientError as e:
+        print(f"\n✗ Error: {e}", file=sys.stderr)
+        if isinstance(e.__cause__, FileNotFoundError):
+            print("Make sure deluge-gtk is installed on your system", file=sys.stderr)
         sys.exit(1)
 
+    if not amv_count:
+        if selected:
+            print("No AMVs match the selection")
+        else:
+            print("No torrents ready to send (no AMVs with state=1)")
+    elif not queued:
+        print("\nNo valid torrent files to send")
+
+
+def cmd_plan(args):
+    """Choose ready torrents that fit into a disk budget."""
+    budget_mb = parse_budget_arg(args.budget)
+    where, params = compile_specs(args.ids, default_state=1)
+
+    if args.send:
+        filled = plan.fill_total_bytes(where, params)
+        if filled:
+            print(events.format_event(events.SizesRead(filled)))
+        report_unknown_sizes(where, params)
+        send_torrents(
+            plan.plan_rows(where, params, budget_mb, policy=args.policy), selected=True
+        )
+        return
+
+    print(f"Plan for {events.format_size(budget_mb)} ({args.policy} first):\n")
+
+    finished = print_events(plan.iter_plan(where, params, budget_mb, policy=args.policy))
+    if finished.count:
+        print("Send them with: amvscrape plan ... --send")
+
 
 def cmd_checklib(args):
     """Scan library directory and mark existing AMVs."""
@@ -204,72 +319,162 @@ def cmd_checklib(args):
 
     print(f"Scanning library at: {args.path}")
 
-    # Scan directory for video files starting with 5-digit IDs
-    import re
+    # Mark the AMVs with files in the library as collected (state=3)
+    print_events(library.iter_checklib(path))
 
-    pattern = re.compile(r"^(\d{5})\.")
-    found_ids = []
 
-    for file_path in path.iterdir():
-        if file_path.is_file():
-            match = pattern.match(file_path.name)
-            if match:
-                amv_id = match.group(1)
-                found_ids.append(amv_id)
+def cmd_store_migrate(args):
+    """Copy all torrent files from one storage backend to another."""
+    try:
+        source = store.get_store(args.source)
+        target = store.get_store(args.target)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if source.kind == target.kind:
+        print("Error: source and target store are the same", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Migrating torrent files: {source.kind} → {target.kind}...")
+    try:
+        count = store.migrate(source, target, delete=args.delete)
+    finally:
+        source.close()
+        target.close()
+    print(f"✓ Copied {count} torrent file(s)")
+    if target.kind != config.TORRENT_STORE:
+        print(f"Set AMVSCRAPE_TORRENT_STORE={target.kind} to use the new store")
+
+
+def cmd_store_export(args):
+    """Print file paths for the selected torrents (exporting them if needed)."""
+    # Only paths on stdout, so the output can be piped to other clients
+    rows = select_rows(args.ids, default_state=1, report_missing=False)
+    torrent_store = store.get_store()
+
+    for chunk in db.batched(rows, config.DB_CHUNK_SIZE):
+        stored = torrent_store.existing(
+            entry["torrentfile"] for entry in chunk if entry["torrentfile"]
+        )
+        for entry in chunk:
+            if entry["torrentfile"] in stored:
+                print(torrent_store.export(entry["torrentfile"]).absolute())
+
+
+def cmd_snapshot(args):
+    """Export AMVs, download options and torrent files to a snapshot file."""
+    try:
+        where, params = selection.compile_selection(args.ids)
+    except selection.SelectionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        counts = snapshot.export_snapshot(Path(args.file), where, params)
+    except FileExistsError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(
+        f"✓ Exported {counts['amvs']} AMVs, {counts['options']} download options, "
+        f"{counts['metadata']} metadata entries and {counts['torrents']} torrent files "
+        f"to {args.file}"
+    )
+
+
+def cmd_merge(args):
+    """Merge snapshot files into the local database."""
+    print(f"Merging {len(args.files)} snapshot(s)...")
+    try:
+        print_events(snapshot.iter_merge(args.files))
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"\n✓ Merged {len(args.files)} snapshot(s)")
+
 
-    if not found_ids:
-        print("No AMV files found in library (no files starting with 5-digit ID)")
+def cmd_changes(args):
+    """Show new AMVs, state changes and replaced torrents from the transition log."""
+    try:
+        rows = db.get_changes_since(args.since, after_seq=args.after)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not rows:
+        print("  (no changes)")
         return
 
-    print(f"Found {len(found_ids)} AMV files in library")
-
-    # Mark them as collected (state=3) in database
-    # Try both with and without leading zeros (e.g., "09938" and "9938")
-    marked_count = 0
-    for amv_id in found_ids:
-        # Try exact match first
-        if db.id_exists(amv_id):
-            db.update_state(amv_id, 3)
-            marked_count += 1
-            print(f"  {amv_id} → marked as collected")
+    for row in rows:
+        if row["change"] == "insert":
+            change = f"new, state {row['new_state']}"
+        elif row["change"] == "torrent":
+            change = f"torrent replaced, state {row['new_state']}"
         else:
-            # Try without leading zeros
-            amv_id_stripped = amv_id.lstrip("0") or "0"
-            if amv_id_stripped != amv_id and db.id_exists(amv_id_stripped):
-                db.update_state(amv_id_stripped, 3)
-                marked_count += 1
-                print(
-                    f"  {amv_id} → marked as collected (matched as {amv_id_stripped})"
-                )
-            else:
-                print(f"  {amv_id} → not in database (skipped)")
+            change = f"state {row['old_state']} → {row['new_state']}"
+        print(f"  {row['seq']:>6} | {row['changed_at']} | {row['amv_id']:>8} | {change}")
 
-    print(f"\n✓ Marked {marked_count}/{len(found_ids)} AMVs as collected (state=3)")
+    print(f"\nTotal: {len(rows)} changes (continue with --after {rows[-1]['seq']})")
+
+
+def cmd_verify(args):
+    """Verify local files against the piece hashes of the stored torrents."""
+    path = Path(args.path)
+    if not path.is_dir():
+        print(f"Error: '{args.path}' is not a valid directory", file=sys.stderr)
+        sys.exit(1)
+
+    # By default check everything that should be on disk (sent or collected)
+    specs = list(args.ids) or ["state=2|3"]
+    rows = select_rows(specs + ["!state=0"])
+
+    print(f"Verifying library at: {args.path}")
+
+    # Complete downloads are marked as collected (state=3)
+    print_events(verify.iter_verify(rows, path, jobs=args.jobs))
+
+
+def cmd_search(args):
+    """Search AMVs by title, author, anime and tags."""
+    query = " ".join(args.query)
+    try:
+        rows = db.search(query, limit=args.limit)
+    except sqlite3.OperationalError as e:
+        print(f"Error: search index not available ({e})", file=sys.stderr)
+        sys.exit(1)
+
+    if not rows:
+        print("  (no matches)")
+        return
+
+    for row in rows:
+        state = row["state"] if row["state"] is not None else "-"
+        line = f"  {row['amv_id']:>8} | state={state} | {row['title'] or '(no title)'}"
+        if row["author"]:
+            line += f" — {row['author']}"
+        print(line)
+        if row["sources"]:
+            print(f"           anime: {row['sources']}")
+        if row["tags"]:
+            print(f"           tags: {row['tags']}")
+
+    print(f"\nTotal: {len(rows)} matches")
 
 
 def cmd_list(args):
     """List all AMVs in database."""
-    # Get filter state if specified
-    state_filter = (
-        args.state if hasattr(args, "state") and args.state is not None else None
-    )
+    specs = list(args.ids)
+    if args.state is not None:
+        specs.append(f"state={args.state}")
 
-    # Fetch from database
-    if state_filter is not None:
-        rows = db.get_by_state(state_filter)
-        print(f"AMVs with state={state_filter}:")
+    rows = select_rows(specs, order=args.order, limit=args.limit)
+    if specs:
+        print(f"AMVs matching {' '.join(specs)}:")
     else:
-        with db.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT id, article_url, torrentfile, state FROM amvs ORDER BY CAST(id AS INTEGER) DESC"
-            )
-            rows = cursor.fetchall()
         print("All AMVs in database:")
 
-    if not rows:
-        print("  (no entries)")
-        return
-
     # State names for readability
     state_names = {
         0: "not collected",
@@ -279,7 +484,9 @@ def cmd_list(args):
     }
 
     # Print each row
+    count = 0
     for row in rows:
+        count += 1
         amv_id = row["id"]
         article_url = row["article_url"]
         state = row["state"]
@@ -295,17 +502,30 @@ def cmd_list(args):
             if match:
                 url_id = match.group(1)
 
+        failure = ""
+        if row["fail_reason"]:
+            retry = row["next_retry_at"] or "never"
+            failure = f" | failed: {row['fail_reason']} ({row['fail_count']}x, retry: {retry})"
+
         print(
-            f"  {amv_id:>8} | url_id={url_id:>8} | state={state} ({state_name:15s}) | torrent={torrentfile}"
+            f"  {amv_id:>8} | url_id={url_id:>8} | state={state} ({state_name:15s}) | torrent={torrentfile}{failure}"
         )
 
-    print(f"\nTotal: {len(rows)} AMVs")
+    if not count:
+        print("  (no entries)")
+        return
+
+    print(f"\nTotal: {count} AMVs")
 
 
 def main():
     """Main CLI entry point."""
     # Initialize database
-    db.init_db()
+    try:
+        db.init_db()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
     parser = argparse.ArgumentParser(
         prog="amvscrape", description="Tool to scrape and manage AMVs from amvnews.ru"
@@ -323,6 +543,11 @@ def main():
         nargs="?",
         help="Maximum number of pages to scrape (optional, default: all)",
     )
+    parser_scrape.add_argument(
+        "--shard",
+        metavar="K/N",
+        help="Only scrape every N-th page starting at page K (split across N nodes)",
+    )
     parser_scrape.set_defaults(func=cmd_scrape)
 
     # download command
@@ -330,10 +555,101 @@ def main():
         "download", help="Download torrent files for AMVs"
     )
     parser_download.add_argument(
-        "id", nargs="?", help="AMV ID to download (optional, default: all pending)"
+        "ids",
+        nargs="*",
+        help="AMV ID(s) or selection to download (optional, default: all pending). "
+        "Ranges/thresholds only select state=0 unless a state filter is given.",
+    )
+    parser_download.add_argument(
+        "--shard",
+        metavar="K/N",
+        help="Only download the K-th of N ID hash partitions (split across N nodes)",
+    )
+    parser_download.add_argument(
+        "--order",
+        choices=list(db.ORDERS),
+        default="id",
+        help="Processing order (default: id, oldest first)",
+    )
+    parser_download.add_argument(
+        "--limit", type=int, help="Maximum number of AMVs to download"
+    )
+    parser_download.add_argument(
+        "--fast",
+        action="store_true",
+        help="Fetch the torrent links directly and only parse the article if there "
+        "are several download options (no metadata for search)",
     )
     parser_download.set_defaults(func=cmd_download)
 
+    # enqueue command
+    parser_enqueue = subparsers.add_parser(
+        "enqueue", help="Add download jobs to the queue for `amvscrape worker`"
+    )
+    parser_enqueue.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to queue (optional, default: all pending AMVs with state=0)",
+    )
+    parser_enqueue.add_argument(
+        "--shard",
+        metavar="K/N",
+        help="Only queue AMVs in the K-th of N ID hash partitions",
+    )
+    parser_enqueue.add_argument(
+        "--order",
+        choices=list(db.ORDERS),
+        default="id",
+        help="Order in which the jobs are processed (default: id, oldest first)",
+    )
+    parser_enqueue.add_argument("--limit", type=int, help="Maximum number of jobs")
+    parser_enqueue.set_defaults(func=cmd_enqueue)
+
+    # worker command
+    parser_worker = subparsers.add_parser(
+        "worker", help="Download torrents for queued jobs (run several at once)"
+    )
+    parser_worker.add_argument(
+        "--wait",
+        action="store_true",
+        help="Keep waiting for new jobs instead of stopping when the queue is empty",
+    )
+    parser_worker.add_argument(
+        "--limit", type=int, help="Maximum number of jobs to process"
+    )
+    parser_worker.add_argument(
+        "--fast",
+        action="store_true",
+        help="Fetch the torrent links directly (see download --fast)",
+    )
+    parser_worker.set_defaults(func=cmd_worker)
+
+    # jobs command
+    parser_jobs = subparsers.add_parser("jobs", help="Show the state of the job queue")
+    parser_jobs.set_defaults(func=cmd_jobs)
+
+    # recheck command
+    parser_recheck = subparsers.add_parser(
+        "recheck", help="Recheck downloaded AMVs for new or better torrents"
+    )
+    parser_recheck.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to recheck (optional, default: a batch of AMVs due for recheck)",
+    )
+    parser_recheck.add_argument(
+        "--limit",
+        type=int,
+        help=f"Maximum number of articles per run (default: {config.RECHECK_BATCH_SIZE})",
+    )
+    parser_recheck.add_argument(
+        "--reopen",
+        action="store_true",
+        help="Move sent/collected AMVs back to state 1 when a better torrent is "
+        "found (default: only replace the torrent file)",
+    )
+    parser_recheck.set_defaults(func=cmd_recheck)
+
     # torrent command
     parser_torrent = subparsers.add_parser(
         "torrent", help="Send torrent files to deluge-gtk"
@@ -341,11 +657,52 @@ def main():
     parser_torrent.add_argument(
         "ids",
         nargs="*",
-        help="AMV ID(s) or ranges to send (optional, default: all with state=1). "
-        "Formats: '12345', '8000-9000', '>9000', '<500'. Multiple can be specified.",
+        help="AMV ID(s) or selection to send (optional, default: all with state=1). "
+        "Formats: '12345', '1,2,3', '8000-9000', '>9000', '<500', 'state=1', "
+        "'size<500M', '!<spec>' (negation). Multiple can be specified. "
+        "Ranges/thresholds only select state=1 unless a state filter is given.",
+    )
+    parser_torrent.add_argument(
+        "--order",
+        choices=list(db.ORDERS),
+        default="id",
+        help="Selection order (default: id, oldest first)",
+    )
+    parser_torrent.add_argument(
+        "--limit", type=int, help="Maximum number of torrents to send"
+    )
+    parser_torrent.add_argument(
+        "--budget",
+        help="Maximum total size of the selected AMVs (e.g. 500G, 800M)",
     )
     parser_torrent.set_defaults(func=cmd_torrent)
 
+    # plan command
+    parser_plan = subparsers.add_parser(
+        "plan", help="Choose ready torrents that fit into a disk budget"
+    )
+    parser_plan.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to plan from (optional, default: all with state=1)",
+    )
+    parser_plan.add_argument(
+        "--budget", required=True, help="Available disk space (e.g. 500G, 800M)"
+    )
+    parser_plan.add_argument(
+        "--policy",
+        choices=plan.POLICIES,
+        default="smallest",
+        help="Which AMVs to prefer: smallest (most AMVs), newest, or resolution "
+        "(most pixels per GB) (default: smallest)",
+    )
+    parser_plan.add_argument(
+        "--send",
+        action="store_true",
+        help="Send the planned torrents to deluge-gtk (like torrent)",
+    )
+    parser_plan.set_defaults(func=cmd_plan)
+
     # checklib command
     parser_checklib = subparsers.add_parser(
         "checklib", help="Scan library directory and mark existing AMVs"
@@ -353,16 +710,132 @@ def main():
     parser_checklib.add_argument("path", help="Path to library directory")
     parser_checklib.set_defaults(func=cmd_checklib)
 
+    # verify command
+    parser_verify = subparsers.add_parser(
+        "verify", help="Verify local files against the piece hashes of the torrents"
+    )
+    parser_verify.add_argument("path", help="Path to library directory")
+    parser_verify.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to verify (optional, default: state=2|3)",
+    )
+    parser_verify.add_argument(
+        "--jobs", type=int, help="Number of hashing processes (default: all CPUs)"
+    )
+    parser_verify.set_defaults(func=cmd_verify)
+
     # list command
     parser_list = subparsers.add_parser("list", help="List all AMVs in database")
+    parser_list.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to list (optional, same formats as for torrent)",
+    )
     parser_list.add_argument(
         "--state",
         type=int,
         choices=[0, 1, 2, 3],
         help="Filter by state (0=not collected, 1=torrent ready, 2=sent to client, 3=in collection)",
     )
+    parser_list.add_argument(
+        "--order",
+        choices=list(db.ORDERS),
+        default="newest",
+        help="Sort order (default: newest)",
+    )
+    parser_list.add_argument("--limit", type=int, help="Maximum number of AMVs to list")
     parser_list.set_defaults(func=cmd_list)
 
+    # search command
+    parser_search = subparsers.add_parser(
+        "search", help="Search AMVs by title, author, anime and tags"
+    )
+    parser_search.add_argument(
+        "query",
+        nargs="+",
+        help="Search words (all must match); FTS5 syntax like 'naruto OR bleach', "
+        "'author:name' or 'prefix*' is supported",
+    )
+    parser_search.add_argument(
+        "--limit", type=int, default=20, help="Maximum number of results (default: 20)"
+    )
+    parser_search.set_defaults(func=cmd_search)
+
+    # store command
+    parser_store = subparsers.add_parser(
+        "store", help="Manage the torrent file storage backend"
+    )
+    store_subparsers = parser_store.add_subparsers(dest="store_command")
+    parser_store_migrate = store_subparsers.add_parser(
+        "migrate", help="Copy all torrent files to another storage backend"
+    )
+    parser_store_migrate.add_argument(
+        "--from",
+        dest="source",
+        default="flat",
+        choices=store.STORE_KINDS,
+        help="Store to copy from (default: flat)",
+    )
+    parser_store_migrate.add_argument(
+        "--to",
+        dest="target",
+        required=True,
+        choices=store.STORE_KINDS,
+        help="Store to copy to",
+    )
+    parser_store_migrate.add_argument(
+        "--delete",
+        action="store_true",
+        help="Remove torrent files from the source after copying",
+    )
+    parser_store_migrate.set_defaults(func=cmd_store_migrate)
+    parser_store_export = store_subparsers.add_parser(
+        "export", help="Print file paths of torrents for other clients"
+    )
+    parser_store_export.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to export (optional, default: all with state=1)",
+    )
+    parser_store_export.set_defaults(func=cmd_store_export)
+    parser_store.set_defaults(func=lambda args: parser_store.print_help())
+
+    # snapshot command
+    parser_snapshot = subparsers.add_parser(
+        "snapshot", help="Export AMVs and torrent files to a snapshot file"
+    )
+    parser_snapshot.add_argument("file", help="Snapshot file to create")
+    parser_snapshot.add_argument(
+        "ids",
+        nargs="*",
+        help="Selection to export (optional, default: everything)",
+    )
+    parser_snapshot.set_defaults(func=cmd_snapshot)
+
+    # merge command
+    parser_merge = subparsers.add_parser(
+        "merge", help="Merge snapshot files into the local database"
+    )
+    parser_merge.add_argument("files", nargs="+", help="Snapshot file(s) to merge")
+    parser_merge.set_defaults(func=cmd_merge)
+
+    # changes command
+    parser_changes = subparsers.add_parser(
+        "changes", help="Show new AMVs, state changes and replaced torrents"
+    )
+    parser_changes.add_argument(
+        "--since",
+        help="Only changes after this UTC timestamp (e.g. 2024-05-01T12:00:00Z)",
+    )
+    parser_changes.add_argument(
+        "--after",
+        type=int,
+        metavar="SEQ",
+        help="Only changes with a higher sequence number (for polling)",
+    )
+    parser_changes.set_defaults(func=cmd_changes)
+
     # Parse arguments
     args = parser.parse_args()
 
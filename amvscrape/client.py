@@ -0,0 +1,77 @@
+"""Hand torrent files over to the torrent client (deluge-gtk by default)."""
+
+import subprocess
+from typing import Iterable, Iterator
+
+from . import config, db, events, store
+
+
+class ClientError(RuntimeError):
+    """Raised when the torrent client could not be called."""
+
+
+def iter_send(rows: Iterable) -> Iterator[events.Event]:
+    """
+    Send the torrent files of the given AMVs to the torrent client.
+
+    All files are passed to one call of config.TORRENT_CLIENT_CMD (one
+    dialog in deluge-gtk). Afterwards the AMVs move to state 2 in one
+    transaction; AMVs that are already in the collection keep state 3.
+
+    Args:
+        rows: AMV rows (or an iterator over rows, e.g. from db.iter_amvs)
+
+    Returns:
+        Iterator over events: one TorrentQueued or Skipped per row, then
+        ClientStarted and TorrentsSent if there was anything to send
+
+    Raises:
+        ClientError: If the client is not installed or failed
+    """
+    torrent_files = []
+    processed_ids = []
+    torrent_store = store.get_store()
+
+    for chunk in db.batched(rows, config.DB_CHUNK_SIZE):
+        # One index lookup per chunk instead of a stat() per file
+        stored = torrent_store.existing(
+            entry["torrentfile"] for entry in chunk if entry["torrentfile"]
+        )
+
+        for entry in chunk:
+            amv_id = entry["id"]
+            torrentfile = entry["torrentfile"]
+
+            if not torrentfile:
+                yield events.Skipped(amv_id, "no_torrent_file")
+                continue
+
+            if torrentfile not in stored:
+                yield events.Skipped(amv_id, "torrent_missing", torrentfile)
+                continue
+
+            torrent_files.append(torrent_store.export(torrentfile))
+            if db.can_transition(entry["state"], 2):
+                processed_ids.append(amv_id)
+            yield events.TorrentQueued(amv_id, torrentfile)
+
+    if not torrent_files:
+        return
+
+    # Convert to absolute paths (required by deluge-gtk)
+    abs_paths = [str(p.absolute()) for p in torrent_files]
+    yield events.ClientStarted(config.TORRENT_CLIENT_CMD, len(abs_paths))
+
+    try:
+        # Call the client with all torrent files at once
+        subprocess.run([config.TORRENT_CLIENT_CMD] + abs_paths, check=True)
+    except subprocess.CalledProcessError as e:
+        raise ClientError(f"calling {config.TORRENT_CLIENT_CMD} failed: {e}") from e
+    except FileNotFoundError as e:
+        raise ClientError(f"{config.TORRENT_CLIENT_CMD} not found") from e
+
+    # Update database: set state=2 for all sent torrents (one transaction)
+    db.transition_states(processed_ids, 2)
+    yield events.TorrentsSent(
+        config.TORRENT_CLIENT_CMD, len(torrent_files), len(processed_ids)
+    )
@@ -12,14 +12,45 @@ PROJECT_ROOT = Path(__file__).parent.parent
 BASE_URL = "https://amvnews.ru"
 NEWS_URL = f"{BASE_URL}/index.php?go=News&in=cat&id=1"
 
-# Pfade
-DB_PATH = PROJECT_ROOT / "amvscrape.db"
-TORRENT_DIR = PROJECT_ROOT / "torrent-files"
+# Pfade (per Umgebungsvariable überschreibbar, z.B. für mehrere Nodes/DBs)
+DB_PATH = Path(os.environ.get("AMVSCRAPE_DB", PROJECT_ROOT / "amvscrape.db"))
+TORRENT_DIR = Path(os.environ.get("AMVSCRAPE_TORRENT_DIR", PROJECT_ROOT / "torrent-files"))
+
+# Torrent-Speicher: "flat" (ein Verzeichnis), "sharded" (Unterverzeichnisse)
+# oder "packed" (eine SQLite-Datei). Umstellen mit `amvscrape store migrate`.
+TORRENT_STORE = os.environ.get("AMVSCRAPE_TORRENT_STORE", "flat")
+TORRENT_PACK_PATH = TORRENT_DIR / "torrents.sqlite"
+TORRENT_PACK_MMAP_SIZE = 256 * 1024 * 1024  # Bytes
+TORRENT_EXPORT_DIR = TORRENT_DIR / "export"  # Für Übergabe an den Client (packed)
+
+# Datenbank: Zeilen pro Abfrage beim Streamen großer Auswahlen
+DB_CHUNK_SIZE = 500
+DB_TIMEOUT = 30  # Sekunden warten, wenn ein anderer Prozess schreibt
+# Journal-Modus der Datenbank: "wal" (Leser blockieren Worker nicht) oder
+# "delete" für Netzwerk-Dateisysteme (NFS, SMB), auf denen WAL nicht funktioniert
+DB_JOURNAL_MODE = (os.environ.get("AMVSCRAPE_DB_JOURNAL_MODE") or "wal").lower()
+
+# Job-Queue für `amvscrape worker` (mehrere Prozesse gleichzeitig)
+JOB_LEASE_SECONDS = 120  # Lease pro Job, danach übernimmt ein anderer Worker
+JOB_HEARTBEAT_INTERVAL = 30  # Sekunden zwischen Lease-Verlängerungen
+JOB_MAX_ATTEMPTS = 3  # Abgelaufene Leases bis ein Job als failed gilt
+JOB_POLL_INTERVAL = 5  # Sekunden warten bei leerer Queue (worker --wait)
 
 # HTTP Settings
 USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
 REQUEST_TIMEOUT = 30  # Sekunden
 REQUEST_DELAY = 1.0  # Sekunden zwischen Requests
 
+# Retry für fehlgeschlagene Downloads (exponentielles Backoff)
+RETRY_BASE_DELAY = 60 * 60  # Sekunden bis zum ersten Retry
+RETRY_MAX_DELAY = 30 * 24 * 60 * 60  # Maximal 30 Tage
+
+# Recheck bereits geladener Artikel (neue/bessere Torrents)
+RECHECK_INTERVAL_DAYS = 30  # Tage bis ein Artikel erneut geprüft wird
+RECHECK_BATCH_SIZE = 100  # Artikel pro `amvscrape recheck` Lauf
+
+# Verify: Bytes pro Hash-Job (große Dateien werden auf mehrere Prozesse verteilt)
+VERIFY_JOB_BYTES = 256 * 1024 * 1024
+
 # Torrent Client
 TORRENT_CLIENT_CMD = "deluge-gtk"  # Muss auf System installiert sein
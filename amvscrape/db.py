@@ -1,19 +1,211 @@
 """Database module for AMV metadata management."""
 
+import itertools
+import json
 import sqlite3
 from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from . import config
 
+# Columns returned for AMV rows
+AMV_COLUMNS = (
+    "id, article_url, torrentfile, state, size_mb, "
+    "fail_reason, fail_count, next_retry_at, "
+    "options_digest, etag, last_modified, checked_at, total_bytes, resolution"
+)
+
+# Download size of an AMV in bytes: from the torrent metadata if known,
+# else the size shown on the article page (same as selection.SIZE_EXPR,
+# but unknown sizes sort as 0)
+SIZE_BYTES_SQL = "COALESCE(total_bytes, CAST(size_mb * 1048576 AS INTEGER), 0)"
+
+# Pixels per frame from a resolution like "1920x1080" (NULL if unknown)
+PIXELS_SQL = (
+    "(CAST(resolution AS INTEGER) "
+    "* CAST(substr(resolution, instr(resolution, 'x') + 1) AS INTEGER))"
+)
+
+# Row orders for iter_amvs: name -> (sort key expressions, direction)
+ORDERS = {
+    "id": (("CAST(id AS INTEGER)", "id"), "ASC"),
+    "newest": (("CAST(id AS INTEGER)", "id"), "DESC"),
+    "smallest": ((SIZE_BYTES_SQL, "CAST(id AS INTEGER)", "id"), "ASC"),
+    # Best resolution per GB first (unknown resolution last)
+    "resolution": (
+        (
+            f"COALESCE({PIXELS_SQL} * 1073741824.0 / NULLIF({SIZE_BYTES_SQL}, 0), 0)",
+            "CAST(id AS INTEGER)",
+            "id",
+        ),
+        "DESC",
+    ),
+}
+
+# Allowed state moves: 0 (not collected) → 1 (torrent ready) → 2 (sent to
+# client) → 3 (in collection). Any state may jump straight to 3 (checklib).
+ALLOWED_TRANSITIONS = {
+    0: (1, 3),
+    1: (2, 3),
+    2: (3,),
+    3: (),
+}
+
+# Additional moves only done when a better torrent was found for an AMV
+# that was already sent or collected (see set_torrent)
+REOPEN_TRANSITIONS = {
+    2: (1,),
+    3: (1,),
+}
+
+# Kinds of entries in state_log: a new AMV, a state move, or a replaced
+# torrent file (state unchanged)
+CHANGE_KINDS = ("insert", "state", "torrent")
+
+# Journal modes for config.DB_JOURNAL_MODE
+JOURNAL_MODES = ("wal", "delete", "truncate", "persist")
+
+# Job queue statuses: queued → running → done/failed (see claim_job)
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+# Download failures that are never retried automatically
+PERMANENT_FAILURES = ("no_torrent",)
+
+# ISO 8601 UTC timestamps with milliseconds, generated by SQLite
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%fZ"
+_NOW_SQL = f"strftime('{_TIMESTAMP_FORMAT}', 'now')"
+
+# Condition for AMVs whose download may be attempted (again) now
+RETRY_DUE_SQL = (
+    "(fail_reason IS NULL OR (fail_reason NOT IN ({permanent}) "
+    "AND (next_retry_at IS NULL OR next_retry_at <= {now})))"
+).format(
+    permanent=", ".join(f"'{reason}'" for reason in PERMANENT_FAILURES),
+    now=_NOW_SQL,
+)
+
+
+class StateTransitionError(ValueError):
+    """Raised when a state change is not allowed or targets unknown AMVs."""
+
+
+# Columns added after the initial schema: name -> column definition
+_AMV_EXTRA_COLUMNS = {
+    "size_mb": "REAL",
+    "fail_reason": "TEXT",
+    "fail_count": "INTEGER NOT NULL DEFAULT 0",
+    "next_retry_at": "TEXT",
+    "options_digest": "TEXT",
+    "etag": "TEXT",
+    "last_modified": "TEXT",
+    "checked_at": "TEXT",
+    "check_errors": "INTEGER NOT NULL DEFAULT 0",
+    "total_bytes": "INTEGER",
+    "resolution": "TEXT",
+}
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: dict) -> None:
+    """Add missing columns to an existing table (simple schema migration)."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _create_meta_table(conn: sqlite3.Connection) -> bool:
+    """
+    Create the amv_meta table, migrating the first layout if needed.
+
+    The first layout had no INTEGER PRIMARY KEY, so the search index was
+    keyed on the implicit rowid, which VACUUM may renumber. Such a table is
+    copied into the new layout, and its search index is dropped.
+
+    Returns:
+        True if rows were migrated (the search index must be rebuilt)
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(amv_meta)")}
+    migrate = bool(columns) and "meta_id" not in columns
+    if migrate:
+        for trigger in ("amv_meta_ai", "amv_meta_ad", "amv_meta_au"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        try:
+            conn.execute("DROP TABLE IF EXISTS amv_search")
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 can't drop it, but won't use it either
+            pass
+        conn.execute("ALTER TABLE amv_meta RENAME TO amv_meta_old")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS amv_meta (
+            meta_id INTEGER PRIMARY KEY,
+            amv_id TEXT NOT NULL UNIQUE,
+            title TEXT,
+            author TEXT,
+            sources TEXT,
+            tags TEXT
+        )
+    """)
+
+    if migrate:
+        conn.execute(
+            "INSERT INTO amv_meta (amv_id, title, author, sources, tags) "
+            "SELECT amv_id, title, author, sources, tags FROM amv_meta_old"
+        )
+        conn.execute("DROP TABLE amv_meta_old")
+    return migrate
+
+
+def _create_search_index(conn: sqlite3.Connection, rebuild: bool = False) -> None:
+    """Create the FTS5 index over amv_meta and the triggers keeping it in sync."""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS amv_search USING fts5(
+            title, author, sources, tags,
+            content='amv_meta', content_rowid='meta_id', tokenize='unicode61'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS amv_meta_ai AFTER INSERT ON amv_meta BEGIN
+            INSERT INTO amv_search (rowid, title, author, sources, tags)
+            VALUES (new.meta_id, new.title, new.author, new.sources, new.tags);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS amv_meta_ad AFTER DELETE ON amv_meta BEGIN
+            INSERT INTO amv_search (amv_search, rowid, title, author, sources, tags)
+            VALUES ('delete', old.meta_id, old.title, old.author, old.sources, old.tags);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS amv_meta_au AFTER UPDATE ON amv_meta BEGIN
+            INSERT INTO amv_search (amv_search, rowid, title, author, sources, tags)
+            VALUES ('delete', old.meta_id, old.title, old.author, old.sources, old.tags);
+            INSERT INTO amv_search (rowid, title, author, sources, tags)
+            VALUES (new.meta_id, new.title, new.author, new.sources, new.tags);
+        END
+    """)
+    if rebuild:
+        conn.execute("INSERT INTO amv_search (amv_search) VALUES ('rebuild')")
+
 
 def init_db() -> None:
     """Initialize database and create table if not exists."""
     db_path = Path(config.DB_PATH)
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with sqlite3.connect(config.DB_PATH) as conn:
+    if config.DB_JOURNAL_MODE not in JOURNAL_MODES:
+        raise ValueError(
+            f"unknown journal mode: '{config.DB_JOURNAL_MODE}' (use one of {JOURNAL_MODES})"
+        )
+
+    with sqlite3.connect(config.DB_PATH, timeout=config.DB_TIMEOUT) as conn:
+        # WAL: readers don't block the writer (several workers, see worker.py).
+        # SQLite answers with the mode actually in use; if WAL is not
+        # possible there, use the default rollback journal.
+        mode = conn.execute(f"PRAGMA journal_mode={config.DB_JOURNAL_MODE}").fetchone()[0]
+        if mode.lower() != config.DB_JOURNAL_MODE:
+            conn.execute("PRAGMA journal_mode=DELETE")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS amvs (
                 id TEXT PRIMARY KEY,
@@ -22,13 +214,79 @@ def init_db() -> None:
                 state INTEGER NOT NULL DEFAULT 0
             )
         """)
+        _ensure_columns(conn, "amvs", _AMV_EXTRA_COLUMNS)
+        # Articles without a size were stored as 0 MB before, they are unknown
+        conn.execute("UPDATE amvs SET size_mb = NULL WHERE size_mb = 0")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS state_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                amv_id TEXT NOT NULL,
+                old_state INTEGER NOT NULL,
+                new_state INTEGER NOT NULL,
+                changed_at TEXT NOT NULL DEFAULT ({_NOW_SQL})
+            )
+        """)
+        _ensure_columns(conn, "state_log", {"change": "TEXT NOT NULL DEFAULT 'state'"})
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_state_log_changed_at ON state_log (changed_at)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS download_options (
+                amv_id TEXT NOT NULL,
+                torrent_url TEXT NOT NULL,
+                size_mb REAL NOT NULL,
+                PRIMARY KEY (amv_id, torrent_url)
+            )
+        """)
+        _ensure_columns(conn, "download_options", {"resolution": "TEXT"})
+        migrated = _create_meta_table(conn)
+        try:
+            _create_search_index(conn, rebuild=migrated)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: everything but `search` still works
+            pass
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS verify_results (
+                amv_id TEXT PRIMARY KEY,
+                info_hash TEXT NOT NULL,
+                files_sig TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pieces_ok INTEGER NOT NULL,
+                pieces_total INTEGER NOT NULL,
+                verified_at TEXT NOT NULL DEFAULT ({_NOW_SQL})
+            )
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS jobs (
+                amv_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at TEXT,
+                heartbeat_at TEXT,
+                enqueued_at TEXT NOT NULL DEFAULT ({_NOW_SQL}),
+                finished_at TEXT,
+                result TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+        # Keyset walks in ID order (see ORDERS and iter_amv_chunks), also
+        # within one state; the expressions must match ORDERS exactly
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_amvs_num_id ON amvs (CAST(id AS INTEGER), id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_amvs_state_num_id "
+            "ON amvs (state, CAST(id AS INTEGER), id)"
+        )
         conn.commit()
 
 
 @contextmanager
 def get_connection():
     """Context manager for database connections."""
-    conn = sqlite3.connect(config.DB_PATH)
+    conn = sqlite3.connect(config.DB_PATH, timeout=config.DB_TIMEOUT)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -56,51 +314,898 @@ def insert_amv(amv_id: str, article_url: str) -> bool:
             "INSERT OR IGNORE INTO amvs (id, article_url, state) VALUES (?, ?, 0)",
             (amv_id, article_url),
         )
-        return cursor.rowcount > 0
+        if cursor.rowcount == 0:
+            return False
+        _log_change(conn, amv_id, "insert")
+        return True
+
+
+def _log_change(conn: sqlite3.Connection, amv_id: str, change: str) -> None:
+    """Log a change that keeps the state (see CHANGE_KINDS) in the caller's transaction."""
+    conn.execute(
+        "INSERT INTO state_log (amv_id, old_state, new_state, change) "
+        "SELECT id, state, state, ? FROM amvs WHERE id = ?",
+        (change, amv_id),
+    )
+
+
+def can_transition(old_state: int, new_state: int) -> bool:
+    """
+    Check whether a state move is allowed.
+
+    Args:
+        old_state: Current state
+        new_state: Target state
+
+    Returns:
+        True if allowed (staying in the same state is always allowed)
+    """
+    return old_state == new_state or new_state in ALLOWED_TRANSITIONS.get(
+        old_state, ()
+    )
+
+
+def _transition(
+    conn: sqlite3.Connection, amv_ids: List[str], new_state: int, reopen: bool = False
+) -> int:
+    """
+    Move AMVs to a new state and log the change, using the caller's transaction.
+
+    All IDs are validated before anything is written. Rows that are already
+    in the target state are left alone and not logged. With reopen, the
+    REOPEN_TRANSITIONS are allowed as well.
+
+    Returns:
+        Number of rows that changed state
+    """
+    ids_json = json.dumps(amv_ids)
+    in_ids = "id IN (SELECT value FROM json_each(?))"
+
+    current = {
+        row["id"]: row["state"]
+        for row in conn.execute(f"SELECT id, state FROM amvs WHERE {in_ids}", (ids_json,))
+    }
+
+    missing = [amv_id for amv_id in amv_ids if amv_id not in current]
+    if missing:
+        raise StateTransitionError(f"unknown AMV ID(s): {', '.join(missing[:10])}")
+
+    invalid = [
+        f"{amv_id} ({state}→{new_state})"
+        for amv_id, state in current.items()
+        if not can_transition(state, new_state)
+        and not (reopen and new_state in REOPEN_TRANSITIONS.get(state, ()))
+    ]
+    if invalid:
+        raise StateTransitionError(
+            f"state change not allowed for {len(invalid)} AMV(s): {', '.join(invalid[:10])}"
+        )
+
+    conn.execute(
+        f"INSERT INTO state_log (amv_id, old_state, new_state) "
+        f"SELECT id, state, ? FROM amvs WHERE {in_ids} AND state != ?",
+        (new_state, ids_json, new_state),
+    )
+    cursor = conn.execute(
+        f"UPDATE amvs SET state = ? WHERE {in_ids} AND state != ?",
+        (new_state, ids_json, new_state),
+    )
+    return cursor.rowcount
+
+
+def transition_states(amv_ids: Iterable[str], new_state: int) -> int:
+    """
+    Move a batch of AMVs to a new state in one transaction.
+
+    Every change is appended to the state_log table with a timestamp. The
+    whole batch is rejected if any AMV is unknown or the move is not allowed
+    (see ALLOWED_TRANSITIONS).
+
+    Args:
+        amv_ids: AMV IDs
+        new_state: New state (0=not collected, 1=torrent available, 2=sent to client, 3=in collection)
+
+    Returns:
+        Number of AMVs that changed state
+
+    Raises:
+        StateTransitionError: If an ID is unknown or a move is not allowed
+    """
+    ids = list(dict.fromkeys(amv_ids))
+    if not ids:
+        return 0
+
+    with get_connection() as conn:
+        return _transition(conn, ids, new_state)
 
 
 def update_state(amv_id: str, state: int) -> None:
     """
-    Update state for an AMV.
+    Update state for a single AMV (see transition_states).
 
     Args:
         amv_id: AMV ID
         state: New state (0=not collected, 1=torrent available, 2=sent to client, 3=in collection)
     """
-    with get_connection() as conn:
-        conn.execute("UPDATE amvs SET state = ? WHERE id = ?", (state, amv_id))
+    transition_states([amv_id], state)
 
 
-def update_torrentfile(amv_id: str, filename: str) -> None:
+def update_torrentfile(
+    amv_id: str, filename: str, size_mb: Optional[float] = None
+) -> None:
     """
     Update torrent filename for an AMV.
 
     Args:
         amv_id: AMV ID
         filename: Name of the .torrent file
+        size_mb: Size of the selected download option in MB (optional)
     """
     with get_connection() as conn:
-        conn.execute("UPDATE amvs SET torrentfile = ? WHERE id = ?", (filename, amv_id))
+        conn.execute(
+            "UPDATE amvs SET torrentfile = ?, size_mb = COALESCE(?, size_mb) WHERE id = ?",
+            (filename, size_mb, amv_id),
+        )
+        _log_change(conn, amv_id, "torrent")
 
 
-def get_by_state(state: int) -> List[sqlite3.Row]:
+def set_torrent(
+    amv_id: str,
+    filename: str,
+    size_mb: Optional[float] = None,
+    reopen: bool = False,
+    total_bytes: Optional[int] = None,
+    resolution: Optional[str] = None,
+) -> None:
     """
-    Get all AMVs with a specific state.
+    Store a downloaded torrent and mark the AMV as torrent ready, atomically.
+
+    AMVs that are already past state 0 keep their state, only the torrent
+    file is replaced - unless reopen is set, which moves them back to
+    state 1 so that the new torrent gets sent to the client.
 
     Args:
-        state: State to filter by
+        amv_id: AMV ID
+        filename: Name of the .torrent file
+        size_mb: Size of the selected download option in MB (optional)
+        reopen: Move AMVs in state 2/3 back to state 1
+        total_bytes: Total size of the files in the torrent (from its metadata)
+        resolution: Resolution of the selected download option, e.g. "1920x1080"
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "UPDATE amvs SET torrentfile = ?, size_mb = COALESCE(?, size_mb), "
+            "total_bytes = ?, resolution = ?, "
+            "fail_reason = NULL, fail_count = 0, next_retry_at = NULL WHERE id = ?",
+            (filename, size_mb, total_bytes, resolution, amv_id),
+        )
+        if cursor.rowcount == 0:
+            raise StateTransitionError(f"unknown AMV ID(s): {amv_id}")
+        row = conn.execute("SELECT state FROM amvs WHERE id = ?", (amv_id,)).fetchone()
+        changed = 0
+        if row["state"] == 0 or reopen:
+            changed = _transition(conn, [amv_id], 1, reopen=reopen)
+        if not changed:
+            # Replaced torrent without a state move: still show up in the log
+            _log_change(conn, amv_id, "torrent")
+
+
+def record_failure(amv_id: str, reason: str) -> None:
+    """
+    Record a failed download attempt and schedule the next retry.
+
+    The retry delay doubles with every failed attempt, starting at
+    config.RETRY_BASE_DELAY and capped at config.RETRY_MAX_DELAY. Reasons in
+    PERMANENT_FAILURES are not retried automatically at all.
+
+    Args:
+        amv_id: AMV ID
+        reason: Failure class (e.g. "no_torrent", "fetch_error", "torrent_error")
+    """
+    with get_connection() as conn:
+        # fail_count on the right hand side is the value before this update
+        conn.execute(
+            f"""
+            UPDATE amvs SET
+                fail_reason = ?,
+                fail_count = fail_count + 1,
+                next_retry_at = CASE WHEN ? THEN NULL ELSE
+                    strftime('{_TIMESTAMP_FORMAT}', 'now',
+                             '+' || MIN(? * (1 << MIN(fail_count, 30)), ?) || ' seconds')
+                END
+            WHERE id = ?
+            """,
+            (
+                reason,
+                reason in PERMANENT_FAILURES,
+                config.RETRY_BASE_DELAY,
+                config.RETRY_MAX_DELAY,
+                amv_id,
+            ),
+        )
+
+
+def save_download_options(
+    amv_id: str, options: List[Tuple[str, float, Optional[str]]]
+) -> None:
+    """
+    Replace the stored torrent download options of an AMV.
+
+    Args:
+        amv_id: AMV ID
+        options: List of (torrent_url, size_mb, resolution) tuples
+    """
+    with get_connection() as conn:
+        conn.execute("DELETE FROM download_options WHERE amv_id = ?", (amv_id,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO download_options "
+            "(amv_id, torrent_url, size_mb, resolution) VALUES (?, ?, ?, ?)",
+            [(amv_id, *option) for option in options],
+        )
+
+
+def set_total_bytes(sizes: List[Tuple[str, int]]) -> None:
+    """
+    Store the torrent sizes of several AMVs in one transaction.
+
+    Args:
+        sizes: List of (amv_id, total_bytes)
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE amvs SET total_bytes = ? WHERE id = ?",
+            [(total_bytes, amv_id) for amv_id, total_bytes in sizes],
+        )
+
+
+def record_check(
+    amv_id: str,
+    digest: Optional[str],
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> None:
+    """
+    Store the download section digest and HTTP validators of an article.
+
+    Args:
+        amv_id: AMV ID
+        digest: Digest of the download options (None keeps the stored one)
+        etag: ETag response header (None keeps the stored one)
+        last_modified: Last-Modified response header (None keeps the stored one)
+    """
+    with get_connection() as conn:
+        conn.execute(
+            f"""
+            UPDATE amvs SET
+                options_digest = COALESCE(?, options_digest),
+                etag = COALESCE(?, etag),
+                last_modified = COALESCE(?, last_modified),
+                checked_at = {_NOW_SQL},
+                check_errors = 0
+            WHERE id = ?
+            """,
+            (digest, etag, last_modified, amv_id),
+        )
+
+
+def record_check_error(amv_id: str) -> None:
+    """
+    Record a failed recheck of an article.
+
+    The article counts as checked, so it doesn't block the batch of the next
+    runs; every further error in a row doubles the wait until the next
+    recheck (see get_recheck_candidates).
+
+    Args:
+        amv_id: AMV ID
+    """
+    with get_connection() as conn:
+        conn.execute(
+            f"UPDATE amvs SET checked_at = {_NOW_SQL}, check_errors = check_errors + 1 "
+            "WHERE id = ?",
+            (amv_id,),
+        )
+
+
+def record_better_option(amv_id: str) -> None:
+    """
+    Record a recheck that found a better torrent which was not downloaded.
+
+    The stored digest is kept and the HTTP validators are dropped, so the
+    next recheck fetches the full article and finds the option again (and
+    downloads it with reopen).
+
+    Args:
+        amv_id: AMV ID
+    """
+    with get_connection() as conn:
+        conn.execute(
+            f"""
+            UPDATE amvs SET
+                etag = NULL,
+                last_modified = NULL,
+                checked_at = {_NOW_SQL},
+                check_errors = 0
+            WHERE id = ?
+            """,
+            (amv_id,),
+        )
+
+
+def get_recheck_candidates(limit: int, interval_days: float) -> Iterator[sqlite3.Row]:
+    """
+    Get downloaded AMVs whose article is due for a recheck, newest first.
+
+    After failed rechecks the interval doubles with every error in a row
+    (at most 8 times the interval, see record_check_error).
+
+    Args:
+        limit: Maximum number of AMVs
+        interval_days: Minimum days since the last check
+
+    Returns:
+        Iterator over Row objects (same columns as get_by_state)
+    """
+    return iter_amvs(
+        f"state >= 1 AND (checked_at IS NULL "
+        f"OR checked_at <= strftime('{_TIMESTAMP_FORMAT}', 'now', "
+        f"'-' || (? * (1 << MIN(check_errors, 3))) || ' days'))",
+        (interval_days,),
+        order="newest",
+        limit=limit,
+    )
+
+
+def _pending_where(where: str) -> str:
+    """Condition for AMVs with state=0 that are due, plus an extra condition."""
+    return f"state = 0 AND {RETRY_DUE_SQL} AND ({where})"
+
+
+def save_metadata(amv_id: str, meta: Dict[str, str]) -> None:
+    """
+    Store article metadata and update the search index.
+
+    Args:
+        amv_id: AMV ID
+        meta: Dict with title, author, sources and tags (missing keys are NULL)
+    """
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO amv_meta (amv_id, title, author, sources, tags)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (amv_id) DO UPDATE SET
+                title = excluded.title,
+                author = excluded.author,
+                sources = excluded.sources,
+                tags = excluded.tags
+            """,
+            (
+                amv_id,
+                meta.get("title"),
+                meta.get("author"),
+                meta.get("sources"),
+                meta.get("tags"),
+            ),
+        )
+
+
+def has_metadata(amv_id: str) -> bool:
+    """
+    Check if article metadata is stored for an AMV.
+
+    Args:
+        amv_id: AMV ID
+
+    Returns:
+        True if save_metadata was called for it
+    """
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT 1 FROM amv_meta WHERE amv_id = ?", (amv_id,))
+        return cursor.fetchone() is not None
+
+
+def search(query: str, limit: int = 20) -> List[sqlite3.Row]:
+    """
+    Full-text search over title, author, anime sources and tags.
+
+    Args:
+        query: FTS5 query (plain words match all of them; if the query is not
+            valid FTS5 syntax, every word is searched as a literal)
+        limit: Maximum number of results
+
+    Returns:
+        List of Row objects with columns: amv_id, title, author, sources, tags,
+        state, rank (best match first)
+    """
+    sql = """
+        SELECT m.amv_id, m.title, m.author, m.sources, m.tags, a.state,
+               bm25(amv_search) AS rank
+        FROM amv_search
+        JOIN amv_meta m ON m.meta_id = amv_search.rowid
+        LEFT JOIN amvs a ON a.id = m.amv_id
+        WHERE amv_search MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """
+    with get_connection() as conn:
+        try:
+            return conn.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                raise
+            quoted = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+            return conn.execute(sql, (quoted, limit)).fetchall()
+
+
+def get_pending_downloads(
+    where: str = "1",
+    params: Sequence = (),
+    order: str = "id",
+    limit: Optional[int] = None,
+) -> Iterator[sqlite3.Row]:
+    """
+    Get AMVs with state=0 that are due for a download attempt.
+
+    AMVs with a permanent failure or a retry time in the future are skipped.
+
+    Args:
+        where: Additional SQL condition (e.g. a shard filter)
+        params: Parameters for the condition
+        order: Row order (see ORDERS)
+        limit: Maximum number of AMVs, None for all
+
+    Returns:
+        Iterator over Row objects (same columns as get_by_state)
+    """
+    return iter_amvs(_pending_where(where), params, order=order, limit=limit)
+
+
+def count_pending_downloads(where: str = "1", params: Sequence = ()) -> int:
+    """
+    Count AMVs returned by get_pending_downloads (without limit).
+
+    Args:
+        where: Additional SQL condition (e.g. a shard filter)
+        params: Parameters for the condition
+
+    Returns:
+        Number of AMVs due for a download attempt
+    """
+    return count_amvs(_pending_where(where), params)
+
+
+def count_deferred_downloads(where: str = "1", params: Sequence = ()) -> int:
+    """
+    Count AMVs with state=0 that are skipped by get_pending_downloads.
+
+    Args:
+        where: Additional SQL condition (e.g. a shard filter)
+        params: Parameters for the condition
+
+    Returns:
+        Number of AMVs waiting for a retry or permanently failed
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"SELECT COUNT(*) FROM amvs "
+            f"WHERE state = 0 AND NOT {RETRY_DUE_SQL} AND ({where})",
+            tuple(params),
+        )
+        return cursor.fetchone()[0]
+
+
+def enqueue_jobs(
+    where: str = "1",
+    params: Sequence = (),
+    order: str = "id",
+    limit: Optional[int] = None,
+    pending: bool = False,
+) -> int:
+    """
+    Add download jobs for the selected AMVs to the job queue.
+
+    AMVs that are already queued or running are left alone; finished or
+    failed jobs are queued again. Jobs are claimed in the order they were
+    first enqueued.
+
+    Args:
+        where: SQL condition selecting the AMVs (e.g. from compile_selection)
+        params: Parameters for the condition
+        order: Enqueue order, one of ORDERS
+        limit: Maximum number of AMVs, None for all
+        pending: Only AMVs that get_pending_downloads would return
+
+    Returns:
+        Number of jobs queued
+    """
+    if order not in ORDERS:
+        raise ValueError(f"unknown order: '{order}' (use one of {tuple(ORDERS)})")
+
+    keys, direction = ORDERS[order]
+    order_by = ", ".join(f"{key} {direction}" for key in keys)
+    if pending:
+        where = _pending_where(where)
+
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"""
+            INSERT INTO jobs (amv_id)
+            SELECT id FROM amvs WHERE ({where}) ORDER BY {order_by} LIMIT ?
+            ON CONFLICT (amv_id) DO UPDATE SET
+                status = 'queued',
+                attempts = 0,
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                heartbeat_at = NULL,
+                enqueued_at = {_NOW_SQL},
+                finished_at = NULL,
+                result = NULL
+            WHERE jobs.status IN ('done', 'failed')
+            """,
+            (*params, -1 if limit is None else limit),
+        )
+        return cursor.rowcount
+
+
+def claim_job(owner: str, lease_seconds: int, max_attempts: int) -> Optional[sqlite3.Row]:
+    """
+    Atomically take the next job from the queue.
+
+    Runs in one BEGIN IMMEDIATE transaction, so two workers never get the
+    same job. Jobs whose lease expired (crashed or hung worker) are claimed
+    again; after max_attempts expired leases a job is marked as failed.
+
+    Args:
+        owner: Worker name stored as lease owner
+        lease_seconds: Lease duration (must be renewed by renew_lease)
+        max_attempts: Claims per job before giving up on it
+
+    Returns:
+        AMV row (columns: see AMV_COLUMNS, plus attempts), or None if the
+        queue is empty
+    """
+    expires = f"strftime('{_TIMESTAMP_FORMAT}', 'now', ?)"
+    expired = f"status = 'running' AND lease_expires_at <= {_NOW_SQL}"
+
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f"""
+            UPDATE jobs SET
+                status = 'failed',
+                result = 'lease_expired',
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                finished_at = {_NOW_SQL}
+            WHERE {expired} AND attempts >= ?
+            """,
+            (max_attempts,),
+        )
+        job = conn.execute(
+            f"SELECT amv_id FROM jobs WHERE status = 'queued' OR ({expired}) "
+            "ORDER BY rowid LIMIT 1"
+        ).fetchone()
+        if job is None:
+            return None
+
+        conn.execute(
+            f"""
+            UPDATE jobs SET
+                status = 'running',
+                attempts = attempts + 1,
+                lease_owner = ?,
+                lease_expires_at = {expires},
+                heartbeat_at = {_NOW_SQL}
+            WHERE amv_id = ?
+            """,
+            (owner, f"+{lease_seconds} seconds", job["amv_id"]),
+        )
+        return conn.execute(
+            f"SELECT {AMV_COLUMNS}, attempts FROM amvs "
+            "JOIN jobs ON jobs.amv_id = amvs.id WHERE amvs.id = ?",
+            (job["amv_id"],),
+        ).fetchone()
+
+
+def renew_lease(amv_id: str, owner: str, lease_seconds: int) -> bool:
+    """
+    Extend the lease of a running job (heartbeat).
+
+    Args:
+        amv_id: AMV ID of the job
+        owner: Worker name the job was claimed with
+        lease_seconds: New lease duration from now
+
+    Returns:
+        True if renewed, False if the worker no longer holds the lease
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE jobs SET
+                lease_expires_at = strftime('{_TIMESTAMP_FORMAT}', 'now', ?),
+                heartbeat_at = {_NOW_SQL}
+            WHERE amv_id = ? AND lease_owner = ? AND status = 'running'
+            """,
+            (f"+{lease_seconds} seconds", amv_id, owner),
+        )
+        return cursor.rowcount > 0
+
+
+def finish_job(amv_id: str, owner: str, status: str, result: Optional[str] = None) -> bool:
+    """
+    Mark a running job as finished, or put it back into the queue.
+
+    Args:
+        amv_id: AMV ID of the job
+        owner: Worker name the job was claimed with
+        status: "done", "failed" or "queued" (release without result)
+        result: Short result note (e.g. the failure reason)
+
+    Returns:
+        True if updated, False if the worker no longer holds the lease
+    """
+    if status not in JOB_STATUSES or status == "running":
+        raise ValueError(f"invalid job status: '{status}'")
+
+    finished_at = "NULL" if status == "queued" else _NOW_SQL
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE jobs SET
+                status = ?,
+                result = ?,
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                finished_at = {finished_at}
+            WHERE amv_id = ? AND lease_owner = ? AND status = 'running'
+            """,
+            (status, result, amv_id, owner),
+        )
+        return cursor.rowcount > 0
+
+
+def count_jobs() -> Dict[str, int]:
+    """
+    Count jobs per status.
+
+    Returns:
+        Dict with a count for every status in JOB_STATUSES, plus "expired"
+        (running jobs whose lease ran out)
+    """
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    with get_connection() as conn:
+        for row in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[row[0]] = row[1]
+        counts["expired"] = conn.execute(
+            f"SELECT COUNT(*) FROM jobs "
+            f"WHERE status = 'running' AND lease_expires_at <= {_NOW_SQL}"
+        ).fetchone()[0]
+    return counts
+
+
+def get_verify_results(amv_ids: List[str]) -> Dict[str, sqlite3.Row]:
+    """
+    Get cached verify results for a batch of AMVs.
+
+    Args:
+        amv_ids: AMV IDs
+
+    Returns:
+        Dict mapping AMV ID to Row with columns: amv_id, info_hash, files_sig,
+        status, pieces_ok, pieces_total, verified_at
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT * FROM verify_results WHERE amv_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(amv_ids),),
+        )
+        return {row["amv_id"]: row for row in cursor}
+
+
+def save_verify_results(results: List[Tuple[str, str, str, str, int, int]]) -> None:
+    """
+    Store verify results in one transaction.
+
+    Args:
+        results: List of (amv_id, info_hash, files_sig, status, pieces_ok, pieces_total)
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            f"""
+            INSERT OR REPLACE INTO verify_results
+                (amv_id, info_hash, files_sig, status, pieces_ok, pieces_total, verified_at)
+            VALUES (?, ?, ?, ?, ?, ?, {_NOW_SQL})
+            """,
+            results,
+        )
+
+
+def get_changes_since(
+    since: Optional[str] = None, after_seq: Optional[int] = None
+) -> List[sqlite3.Row]:
+    """
+    Get changes from the transition log.
+
+    Besides state moves, the log has an entry for every new AMV and every
+    replaced torrent file (see CHANGE_KINDS). To sync from the log, poll with
+    after_seq set to the highest seq seen so far: unlike timestamps, seq
+    never goes backwards.
+
+    Args:
+        since: ISO 8601 UTC timestamp (e.g. "2024-05-01T12:00:00Z"), None for all
+        after_seq: Only entries with a higher seq, None for all
 
     Returns:
-        List of Row objects with columns: id, article_url, torrentfile, state
+        List of Row objects with columns: seq, amv_id, old_state, new_state,
+        changed_at, change (ordered by seq)
+
+    Raises:
+        ValueError: If since is not a valid timestamp
     """
+    conditions = []
+    params: list = []
+
     with get_connection() as conn:
+        if since is not None:
+            # Normalize the input to the stored format so that string
+            # comparison matches time order
+            normalized = conn.execute(
+                f"SELECT strftime('{_TIMESTAMP_FORMAT}', ?)", (since,)
+            ).fetchone()[0]
+            if normalized is None:
+                raise ValueError(
+                    f"invalid timestamp: '{since}' (expected ISO 8601, "
+                    "e.g. 2024-05-01T12:00:00Z)"
+                )
+            conditions.append("changed_at > ?")
+            params.append(normalized)
+        if after_seq is not None:
+            conditions.append("seq > ?")
+            params.append(after_seq)
+
+        where = " AND ".join(conditions) or "1"
         cursor = conn.execute(
-            "SELECT id, article_url, torrentfile, state FROM amvs WHERE state = ?",
-            (state,),
+            f"SELECT * FROM state_log WHERE {where} ORDER BY seq", params
         )
         return cursor.fetchall()
 
 
+def get_by_state(state: int, order: str = "id") -> Iterator[sqlite3.Row]:
+    """
+    Get all AMVs with a specific state.
+
+    Args:
+        state: State to filter by
+        order: Row order (see ORDERS)
+
+    Returns:
+        Iterator over Row objects with columns: see AMV_COLUMNS
+    """
+    return iter_amvs("state = ?", (state,), order=order)
+
+
+def iter_amv_chunks(
+    where: str = "1",
+    params: Sequence = (),
+    order: str = "id",
+    limit: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[List[sqlite3.Row]]:
+    """
+    Stream AMVs matching a WHERE clause in chunks.
+
+    Uses keyset pagination: every chunk is a separate short query that
+    continues after the last row of the previous chunk, so no connection
+    (and no read lock) is held while the caller processes a chunk. For the
+    ID orders ("id", "newest") each chunk is a range search on the ID
+    indexes, so only as many rows are read as are consumed; the size and
+    resolution orders have no index and sort the remaining matches per chunk.
+
+    Args:
+        where: SQL condition (e.g. from selection.compile_selection)
+        params: Parameters for the condition
+        order: Row order, one of ORDERS
+        limit: Maximum number of rows in total, None for all
+        chunk_size: Rows per query (default: config.DB_CHUNK_SIZE)
+
+    Returns:
+        Iterator over lists of Row objects (columns: see AMV_COLUMNS)
+    """
+    if order not in ORDERS:
+        raise ValueError(f"unknown order: '{order}' (use one of {tuple(ORDERS)})")
+
+    keys, direction = ORDERS[order]
+    key_list = ", ".join(keys)
+    key_aliases = ", ".join(f"{key} AS _key{i}" for i, key in enumerate(keys))
+    order_by = ", ".join(f"{key} {direction}" for key in keys)
+    comparison = ">" if direction == "ASC" else "<"
+    chunk_size = chunk_size or config.DB_CHUNK_SIZE
+
+    last_key = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        after = ""
+        after_params: list = []
+        if last_key is not None:
+            placeholders = ", ".join("?" for _ in keys)
+            # SQLite only starts an index range on the leading key by itself,
+            # not on the row value comparison
+            after = (
+                f"AND {keys[0]} {comparison}= ? "
+                f"AND ({key_list}) {comparison} ({placeholders})"
+            )
+            after_params = [last_key[0], *last_key]
+
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"SELECT {AMV_COLUMNS}, {key_aliases} FROM amvs "
+                f"WHERE ({where}) {after} ORDER BY {order_by} LIMIT ?",
+                (*params, *after_params, size),
+            ).fetchall()
+
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < size:
+            return
+        last_key = tuple(rows[-1][f"_key{i}"] for i in range(len(keys)))
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of up to size items from an iterable (e.g. from iter_amvs)."""
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_amvs(
+    where: str = "1",
+    params: Sequence = (),
+    order: str = "id",
+    limit: Optional[int] = None,
+) -> Iterator[sqlite3.Row]:
+    """
+    Stream AMVs matching a WHERE clause row by row (see iter_amv_chunks).
+
+    Args:
+        where: SQL condition (e.g. from selection.compile_selection)
+        params: Parameters for the condition
+        order: Row order, one of ORDERS
+        limit: Maximum number of rows, None for all
+
+    Returns:
+        Iterator over Row objects (columns: see AMV_COLUMNS)
+    """
+    for chunk in iter_amv_chunks(where, params, order=order, limit=limit):
+        yield from chunk
+
+
+def count_amvs(where: str = "1", params: Sequence = ()) -> int:
+    """
+    Count AMVs matching a WHERE clause.
+
+    Args:
+        where: SQL condition
+        params: Parameters for the condition
+
+    Returns:
+        Number of matching AMVs
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(f"SELECT COUNT(*) FROM amvs WHERE {where}", tuple(params))
+        return cursor.fetchone()[0]
+
+
 def get_by_id(amv_id: str) -> Optional[sqlite3.Row]:
     """
     Get single AMV by ID.
@@ -113,12 +1218,31 @@ def get_by_id(amv_id: str) -> Optional[sqlite3.Row]:
     """
     with get_connection() as conn:
         cursor = conn.execute(
-            "SELECT id, article_url, torrentfile, state FROM amvs WHERE id = ?",
+            f"SELECT {AMV_COLUMNS} FROM amvs WHERE id = ?",
             (amv_id,),
         )
         return cursor.fetchone()
 
 
+def find_missing_ids(amv_ids: Sequence[int]) -> List[int]:
+    """
+    Find numeric AMV IDs that are not in the database.
+
+    Args:
+        amv_ids: Numeric AMV IDs (leading zeros in the stored IDs don't matter)
+
+    Returns:
+        IDs without a matching AMV, in the given order
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT value FROM json_each(?) "
+            "WHERE value NOT IN (SELECT CAST(id AS INTEGER) FROM amvs) ORDER BY key",
+            (json.dumps(list(amv_ids)),),
+        )
+        return [row[0] for row in cursor]
+
+
 def id_exists(amv_id: str) -> bool:
     """
     Check if AMV ID exists in database.
@@ -1,41 +1,83 @@
 """Torrent file download module."""
 
+import hashlib
 import re
+import sqlite3
+import time
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import requests
 from bs4 import BeautifulSoup
 
-from . import config, db
+from . import bencode, config, db, events, selection, store
 
+# A download option from an article: (torrent_url, size_mb, resolution)
+DownloadOption = Tuple[str, float, Optional[str]]
 
-def parse_download_options(article_url: str) -> List[Tuple[str, float]]:
+
+def fetch_article(
+    article_url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> Optional[requests.Response]:
     """
-    Parse article page for torrent download links.
+    Fetch an article page, optionally as a conditional request.
 
     Args:
         article_url: URL to AMV article page
+        etag: ETag from a previous fetch (sent as If-None-Match)
+        last_modified: Last-Modified from a previous fetch (sent as If-Modified-Since)
 
     Returns:
-        List of (torrent_url, size_mb) tuples
+        Response (status 200, or 304 if unchanged)
+
+    Raises:
+        requests.RequestException: If the article could not be fetched
     """
     headers = {
         "User-Agent": config.USER_AGENT,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "en-US,en;q=0.5",
     }
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = requests.get(article_url, headers=headers, timeout=config.REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+def parse_download_options(article_url: str) -> Optional[List[DownloadOption]]:
+    """
+    Parse article page for torrent download links.
 
+    Args:
+        article_url: URL to AMV article page
+
+    Returns:
+        List of (torrent_url, size_mb, resolution) tuples (empty if the article
+        has no torrents), or None if the article could not be fetched
+    """
     try:
-        response = requests.get(
-            article_url, headers=headers, timeout=config.REQUEST_TIMEOUT
-        )
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching article {article_url}: {e}")
-        return []
+        response = fetch_article(article_url)
+    except requests.RequestException:
+        return None
 
-    soup = BeautifulSoup(response.content, "lxml")
+    return extract_download_options(BeautifulSoup(response.content, "lxml"))
+
+
+def extract_download_options(soup: BeautifulSoup) -> List[DownloadOption]:
+    """
+    Extract torrent download links from a parsed article page.
+
+    Args:
+        soup: Parsed article page
+
+    Returns:
+        List of (torrent_url, size_mb, resolution) tuples; resolution is
+        e.g. "1920x1080", or None if the article doesn't show it
+    """
     options = []
 
     # Look for torrent download links
@@ -50,6 +92,7 @@ def parse_download_options(article_url: str) -> List[Tuple[str, float]]:
         if "torrent" in text.lower() and "go=Files&file=downtorrent" in href:
             # Look for the next span with class="rating-text" which contains the size
             size_mb = 0.0
+            resolution = None
 
             # Navigate up to parent and find the rating-text span
             parent = link.parent
@@ -65,6 +108,7 @@ def parse_download_options(article_url: str) -> List[Tuple[str, float]]:
                 if size_span:
                     size_text = size_span.get_text(strip=True)
                     size_mb = extract_size_mb(size_text)
+                    resolution = extract_resolution(size_text)
 
             # Construct full URL
             if href.startswith("http"):
@@ -72,11 +116,86 @@ def parse_download_options(article_url: str) -> List[Tuple[str, float]]:
             else:
                 torrent_url = f"{config.BASE_URL}/{href.lstrip('/')}"
 
-            options.append((torrent_url, size_mb))
+            options.append((torrent_url, size_mb, resolution))
 
     return options
 
 
+# Field labels on article pages (Russian and English layout), lower case
+_METADATA_LABELS = {
+    "author": ("автор", "авторы", "author", "authors"),
+    "sources": ("аниме", "anime", "источник", "источники", "source", "sources"),
+    "tags": ("теги", "tags", "стиль", "style", "жанр", "genre"),
+}
+_METADATA_LABEL_TAGS = ["b", "strong", "span", "td", "th", "dt", "label"]
+_METADATA_BLOCK_TAGS = {"br", "div", "p", "table", "tr", "li", "ul", "h1", "h2", "h3"}
+
+
+def _label_value(element) -> str:
+    """Text following a label element, up to the next label or line break."""
+    if element.name in ("td", "th", "dt"):
+        value = element.find_next_sibling(["td", "dd"])
+        return value.get_text(" ", strip=True) if value else ""
+
+    parts = []
+    for sibling in element.next_siblings:
+        name = getattr(sibling, "name", None)
+        if name in _METADATA_BLOCK_TAGS or name in ("b", "strong"):
+            break
+        text = sibling.get_text(" ", strip=True) if name else str(sibling).strip()
+        if text:
+            parts.append(text)
+    return re.sub(r"\s+([,;])", r"\1", " ".join(parts)).strip(" :,;")
+
+
+def extract_metadata(soup: BeautifulSoup) -> Dict[str, str]:
+    """
+    Extract title, author, anime sources and tags from a parsed article page.
+
+    The title comes from og:title, the first <h1> or <title>. The other fields
+    are found by their labels ("Автор:", "Anime:", ...); fields that can't be
+    found are left out.
+
+    Args:
+        soup: Parsed article page
+
+    Returns:
+        Dict with some or all of the keys title, author, sources and tags
+    """
+    meta: Dict[str, str] = {}
+
+    og_title = soup.find("meta", property="og:title")
+    heading = soup.find("h1")
+    if og_title and og_title.get("content", "").strip():
+        meta["title"] = og_title["content"].strip()
+    elif heading and heading.get_text(strip=True):
+        meta["title"] = heading.get_text(" ", strip=True)
+    elif soup.title and soup.title.string:
+        meta["title"] = soup.title.string.strip()
+
+    labels = {
+        label: field for field, names in _METADATA_LABELS.items() for label in names
+    }
+    pattern = re.compile(
+        r"^(" + "|".join(map(re.escape, labels)) + r")\s*:\s*(.*)$",
+        re.IGNORECASE | re.DOTALL,
+    )
+
+    for element in soup.find_all(_METADATA_LABEL_TAGS):
+        match = pattern.match(element.get_text(" ", strip=True))
+        if not match:
+            continue
+        field = labels[match.group(1).lower()]
+        if field in meta:
+            continue
+        # "<b>Автор:</b> Name" or "<b>Автор: Name</b>"
+        value = match.group(2).strip() or _label_value(element)
+        if value:
+            meta[field] = value
+
+    return meta
+
+
 def extract_size_mb(text: str) -> float:
     """
     Extract file size in MB from text.
@@ -104,17 +223,51 @@ def extract_size_mb(text: str) -> float:
     return size
 
 
+def extract_resolution(text: str) -> Optional[str]:
+    """
+    Extract the video resolution from text.
+
+    Args:
+        text: Text containing resolution info (e.g., "140.99 Mb 1920x1080@25fps")
+
+    Returns:
+        Resolution as "WIDTHxHEIGHT", or None if not found
+    """
+    # Latin x, Cyrillic х or ×
+    match = re.search(r"(\d{3,5})\s*[xх×]\s*(\d{3,5})", text)
+    if not match:
+        return None
+    return f"{match.group(1)}x{match.group(2)}"
+
+
+def options_digest(options: List[DownloadOption]) -> str:
+    """
+    Digest of an article's download section (independent of link order).
+
+    Only links and sizes are included, so digests stay comparable with
+    those recorded before resolutions were stored.
+
+    Args:
+        options: List of (torrent_url, size_mb, resolution) tuples
+
+    Returns:
+        Hex SHA-1 digest
+    """
+    lines = sorted(f"{url} {size_mb:.2f}" for url, size_mb, _ in options)
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
 def select_best_torrent(
-    options: List[Tuple[str, float]],
-) -> Optional[Tuple[str, float]]:
+    options: List[DownloadOption],
+) -> Optional[DownloadOption]:
     """
     Select largest torrent file (heuristic: best quality).
 
     Args:
-        options: List of (torrent_url, size_mb) tuples
+        options: List of (torrent_url, size_mb, resolution) tuples
 
     Returns:
-        Selected (torrent_url, size_mb) tuple, or None if no options
+        Selected (torrent_url, size_mb, resolution) tuple, or None if no options
     """
     if not options:
         return None
@@ -123,118 +276,554 @@ def select_best_torrent(
     return max(options, key=lambda x: x[1])
 
 
-def download_torrent(torrent_url: str, amv_id: str) -> Optional[str]:
+def downtorrent_url(amv_id: str, alt: int) -> str:
+    """
+    Build the direct torrent link for an AMV (see scrape-hints.md).
+
+    Args:
+        amv_id: AMV ID
+        alt: Index of the download option (0 for the first)
+
+    Returns:
+        Full downtorrent URL
+    """
+    return f"{config.BASE_URL}/index.php?go=Files&file=downtorrent&id={amv_id}&alt={alt}"
+
+
+def fetch_torrent(torrent_url: str) -> requests.Response:
     """
-    Download .torrent file and save to torrent-files/.
+    Fetch a .torrent file.
 
     Args:
         torrent_url: URL to .torrent file
-        amv_id: AMV ID for filename
 
     Returns:
-        Filename of saved torrent file, or None on error
+        Response with the torrent as content
+
+    Raises:
+        requests.RequestException: If the download failed
     """
     headers = {
         "User-Agent": config.USER_AGENT,
     }
 
+    response = requests.get(torrent_url, headers=headers, timeout=config.REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+def save_torrent(amv_id: str, data: bytes) -> str:
+    """
+    Save a .torrent file to the torrent store as {id}.torrent.
+
+    Args:
+        amv_id: AMV ID for filename
+        data: Torrent file content
+
+    Returns:
+        Filename of saved torrent file
+
+    Raises:
+        OSError, sqlite3.Error: If the torrent could not be stored
+    """
+    filename = f"{amv_id}.torrent"
+    store.get_store().write(filename, data)
+    return filename
+
+
+def torrent_total_bytes(data: bytes) -> Optional[int]:
+    """
+    Total size of the files in a torrent.
+
+    Args:
+        data: Torrent file content
+
+    Returns:
+        Size in bytes, or None if the data is not a valid torrent
+    """
     try:
-        response = requests.get(
-            torrent_url, headers=headers, timeout=config.REQUEST_TIMEOUT
-        )
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error downloading torrent for AMV {amv_id}: {e}")
+        return bencode.torrent_info(data)["total_length"]
+    except bencode.BencodeError:
         return None
 
-    # Ensure torrent directory exists
-    config.TORRENT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Save as {id}.torrent
-    filename = f"{amv_id}.torrent"
-    filepath = config.TORRENT_DIR / filename
+def download_torrent(torrent_url: str, amv_id: str) -> Tuple[str, Optional[int]]:
+    """
+    Download .torrent file and save it to the torrent store.
+
+    Args:
+        torrent_url: URL to .torrent file
+        amv_id: AMV ID for filename
+
+    Returns:
+        (filename of saved torrent file, total size in bytes from the torrent
+        metadata or None if it can't be read)
+
+    Raises:
+        requests.RequestException: If the download failed
+        OSError, sqlite3.Error: If the torrent could not be stored
+    """
+    data = fetch_torrent(torrent_url).content
+    return save_torrent(amv_id, data), torrent_total_bytes(data)
+
+
+def _is_torrent(data: bytes) -> bool:
+    """Check if a downtorrent answer is a torrent (unknown indices get an HTML page)."""
+    try:
+        bencode.torrent_info(data)
+    except bencode.BencodeError:
+        return False
+    return True
 
+
+def probe_torrent(amv_id: str) -> Optional[Tuple[str, bytes, int]]:
+    """
+    Fetch the torrent of an AMV with a single download option without the article.
+
+    Fetches the downtorrent links with alt=0 and alt=1 (config.REQUEST_DELAY
+    apart). The torrent of alt=0 is only taken if alt=1 is no torrent: with
+    several options, the largest may be any of them (e.g. alt=1), and the
+    article shows all sizes at once.
+
+    Args:
+        amv_id: AMV ID
+
+    Returns:
+        (torrent_url, torrent data, total_bytes) of the only torrent, or None
+        if the result is not certain (alt=0 is no torrent, alt=1 is one, or a
+        request failed) and the article should be parsed instead
+    """
+    url = downtorrent_url(amv_id, 0)
     try:
-        with open(filepath, "wb") as f:
-            f.write(response.content)
-    except IOError as e:
-        print(f"Error saving torrent file {filename}: {e}")
+        data = fetch_torrent(url).content
+        info = bencode.torrent_info(data)
+    except (requests.RequestException, bencode.BencodeError):
         return None
 
-    return filename
+    # Rate limiting - be nice to the server
+    time.sleep(config.REQUEST_DELAY)
+
+    try:
+        second = fetch_torrent(downtorrent_url(amv_id, 1)).content
+    except requests.HTTPError as e:
+        # 404: no second download option
+        if e.response is not None and e.response.status_code == 404:
+            return url, data, info["total_length"]
+        return None
+    except requests.RequestException:
+        return None
+
+    if _is_torrent(second):
+        return None
+    return url, data, info["total_length"]
+
+
+def download_entry(entry) -> Union[events.TorrentSaved, events.Failure]:
+    """
+    Download the torrent for an AMV row and record the result in the database.
 
+    Article metadata and the download section are stored along the way (see
+    save_metadata, save_download_options and record_check). Failures are
+    recorded with db.record_failure, so that they are retried later.
 
-def download_for_amv(amv_id: str) -> bool:
+    Args:
+        entry: Row with at least id and article_url
+
+    Returns:
+        TorrentSaved, or Failure with reason "fetch_error", "no_torrent" or
+        "torrent_error"
+    """
+    amv_id = entry["id"]
+
+    # Fetch article and parse download options
+    try:
+        response = fetch_article(entry["article_url"])
+    except requests.RequestException as e:
+        db.record_failure(amv_id, "fetch_error")
+        return events.Failure(amv_id, "fetch_error", str(e))
+
+    soup = BeautifulSoup(response.content, "lxml")
+    options = extract_download_options(soup)
+    db.save_metadata(amv_id, extract_metadata(soup))
+
+    # Remember the download section for recheck
+    db.save_download_options(amv_id, options)
+    db.record_check(
+        amv_id,
+        options_digest(options),
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
+
+    # Select best (largest) torrent
+    best = select_best_torrent(options)
+    if not best:
+        db.record_failure(amv_id, "no_torrent")
+        return events.Failure(amv_id, "no_torrent", "no torrent downloads in article")
+
+    torrent_url, size_mb, resolution = best
+    try:
+        filename, total_bytes = download_torrent(torrent_url, amv_id)
+    except (requests.RequestException, OSError, sqlite3.Error) as e:
+        db.record_failure(amv_id, "torrent_error")
+        return events.Failure(amv_id, "torrent_error", str(e))
+
+    # Update database (torrent file + state 1 = torrent ready, atomically).
+    # extract_size_mb gives 0.0 if the article shows no size: that is unknown,
+    # not 0 MB (which would fit every budget)
+    db.set_torrent(
+        amv_id,
+        filename,
+        size_mb or None,
+        total_bytes=total_bytes,
+        resolution=resolution,
+    )
+    return events.TorrentSaved(amv_id, filename, size_mb)
+
+
+def download_entry_fast(entry) -> Union[events.TorrentSaved, events.Failure]:
+    """
+    Like download_entry, but fetch the torrent directly if there is only one.
+
+    Falls back to download_entry (after config.REQUEST_DELAY) if
+    probe_torrent has no certain result, e.g. for several download options.
+    Without the article, no metadata, download options or digest are stored
+    (recheck records the digest as a baseline later).
+
+    Args:
+        entry: Row with at least id and article_url
+
+    Returns:
+        TorrentSaved or Failure (see download_entry)
+    """
+    amv_id = entry["id"]
+
+    best = probe_torrent(amv_id)
+    if best is None:
+        # Rate limiting - the article is the next request to the same server
+        time.sleep(config.REQUEST_DELAY)
+        return download_entry(entry)
+
+    _, data, total_bytes = best
+    size_mb = total_bytes / (1024 * 1024)
+    try:
+        filename = save_torrent(amv_id, data)
+    except (OSError, sqlite3.Error) as e:
+        db.record_failure(amv_id, "torrent_error")
+        return events.Failure(amv_id, "torrent_error", str(e))
+
+    db.set_torrent(amv_id, filename, size_mb, total_bytes=total_bytes)
+    return events.TorrentSaved(amv_id, filename, size_mb)
+
+
+def iter_download(rows: Iterable, fast: bool = False) -> Iterator[events.Event]:
+    """
+    Download the torrents for the given AMVs.
+
+    Args:
+        rows: Rows (or an iterator over rows) from the database
+        fast: Probe the direct torrent links first (see download_entry_fast)
+
+    Returns:
+        Iterator over one TorrentSaved or Failure event per row
+    """
+    download = download_entry_fast if fast else download_entry
+    for entry in rows:
+        yield download(entry)
+
+
+def download_for_entry(
+    entry, sink: Optional[events.Sink] = None, fast: bool = False
+) -> bool:
+    """
+    Download torrent for an AMV row that was already fetched from the database.
+
+    Args:
+        entry: Row with at least id and article_url
+        sink: Receives the result event (default: print to stdout)
+        fast: Probe the direct torrent links first (see download_entry_fast)
+
+    Returns:
+        True if successful, False otherwise
+    """
+    event = download_entry_fast(entry) if fast else download_entry(entry)
+    (sink or events.PrintSink())(event)
+    return isinstance(event, events.TorrentSaved)
+
+
+def download_for_amv(
+    amv_id: str, sink: Optional[events.Sink] = None, fast: bool = False
+) -> bool:
     """
     Download torrent for a single AMV by ID.
 
     Args:
         amv_id: AMV ID
+        sink: Receives the result event (default: print to stdout)
+        fast: Probe the direct torrent links first (see download_entry_fast)
 
     Returns:
         True if successful, False otherwise
     """
-    # Get AMV from database
     entry = db.get_by_id(amv_id)
     if not entry:
-        print(f"AMV {amv_id} not found in database")
+        (sink or events.PrintSink())(
+            events.Failure(amv_id, "not_found", "not in database")
+        )
         return False
 
-    article_url = entry["article_url"]
+    return download_for_entry(entry, sink, fast)
 
-    # Parse download options
-    options = parse_download_options(article_url)
 
-    if not options:
-        print(f"No torrent downloads found for AMV {amv_id}")
-        return False
+def iter_download_pending(
+    shard: Optional[Tuple[int, int]] = None,
+    order: str = "id",
+    limit: Optional[int] = None,
+    fast: bool = False,
+) -> Iterator[events.Event]:
+    """
+    Download all torrents for AMVs with state=0.
 
-    # Select best (largest) torrent
-    best = select_best_torrent(options)
-    if not best:
-        print(f"Could not select torrent for AMV {amv_id}")
-        return False
+    AMVs without torrents and AMVs whose retry time hasn't come yet are
+    skipped (see db.record_failure). Rows are streamed from the database, so
+    memory use doesn't depend on the size of the backlog.
 
-    torrent_url, size_mb = best
-    print(f"  Downloading {size_mb:.2f} MB torrent...", end=" ", flush=True)
+    Args:
+        shard: (k, n) to only handle the k-th of n ID hash partitions
+        order: Processing order (see db.ORDERS), e.g. "newest"
+        limit: Maximum number of AMVs to process, None for all
+        fast: Probe the direct torrent links first (see download_entry_fast)
+
+    Returns:
+        Iterator over events: DownloadStarted, one TorrentSaved or Failure
+        per AMV, then DownloadFinished
+    """
+    where, params = selection.shard_sql(*shard) if shard else ("1", [])
 
-    # Download
-    filename = download_torrent(torrent_url, amv_id)
+    deferred = db.count_deferred_downloads(where, params)
+    total = db.count_pending_downloads(where, params)
+    if limit is not None:
+        total = min(total, limit)
 
-    if not filename:
-        print("FAILED")
-        return False
+    yield events.DownloadStarted(total, deferred)
+    if not total:
+        return
 
-    # Update database
-    db.update_torrentfile(amv_id, filename)
-    db.update_state(amv_id, 1)  # State 1 = torrent ready
+    success_count = 0
+    rows = db.get_pending_downloads(where, params, order=order, limit=limit)
+    for event in iter_download(rows, fast=fast):
+        if isinstance(event, events.TorrentSaved):
+            success_count += 1
+        yield event
 
-    print("OK")
-    return True
+    yield events.DownloadFinished(success_count, total)
 
 
-def download_all_pending() -> int:
+def download_all_pending(
+    shard: Optional[Tuple[int, int]] = None,
+    order: str = "id",
+    limit: Optional[int] = None,
+    sink: Optional[events.Sink] = None,
+    fast: bool = False,
+) -> int:
     """
-    Download all torrents for AMVs with state=0.
+    Download all pending torrents (see iter_download_pending).
+
+    Args:
+        shard: (k, n) to only handle the k-th of n ID hash partitions
+        order: Processing order (see db.ORDERS)
+        limit: Maximum number of AMVs to process, None for all
+        sink: Receives every event (default: print to stdout)
+        fast: Probe the direct torrent links first (see download_entry_fast)
 
     Returns:
         Number of torrents downloaded
     """
-    pending = db.get_by_state(0)
+    success_count = 0
+    for event in events.emit(
+        iter_download_pending(shard, order, limit, fast), sink or events.PrintSink()
+    ):
+        if isinstance(event, events.TorrentSaved):
+            success_count += 1
+    return success_count
 
-    if not pending:
-        print("No pending AMVs to download")
-        return 0
 
-    print(f"Found {len(pending)} AMVs to download\n")
+def recheck_entry(entry, reopen: bool = False) -> events.Rechecked:
+    """
+    Recheck the article of an already downloaded AMV for new or better torrents.
+
+    Uses a conditional request if the server sent ETag/Last-Modified before
+    and the article metadata is stored already (AMVs downloaded before the
+    search index or with --fast get their metadata this way).
+    A new torrent is only downloaded if the download section changed and its
+    best option is larger than the one we have. AMVs already sent to the
+    client (state 2/3) keep their torrent unless reopen is set, as the
+    downloaded video belongs to it (see verify); the better option is only
+    reported then (see db.record_better_option). Errors are recorded with
+    db.record_check_error, so a failing article doesn't come up in every run.
 
-    success_count = 0
-    for entry in pending:
-        amv_id = entry["id"]
-        print(f"AMV {amv_id}:", end=" ", flush=True)
+    Args:
+        entry: Row from the database
+        reopen: Replace the torrent of AMVs in state 2/3 too and move them
+            back to state 1, so that the new torrent gets sent to the client
 
-        if download_for_amv(amv_id):
-            success_count += 1
+    Returns:
+        Rechecked event with result "unchanged", "changed" (download section
+        changed, nothing better), "better" (better torrent not downloaded,
+        see above), "upgraded" (better torrent downloaded) or "error"
+    """
+    amv_id = entry["id"]
 
-    print(f"\nDownloaded {success_count}/{len(pending)} torrents successfully")
-    return success_count
+    # A 304 response has no body to read the metadata from
+    if db.has_metadata(amv_id):
+        etag, last_modified = entry["etag"], entry["last_modified"]
+    else:
+        etag = last_modified = None
+
+    try:
+        response = fetch_article(entry["article_url"], etag, last_modified)
+    except requests.RequestException as e:
+        db.record_check_error(amv_id)
+        return events.Rechecked(amv_id, "error", message=str(e))
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    if response.status_code == 304:
+        db.record_check(amv_id, None, etag, last_modified)
+        return events.Rechecked(amv_id, "unchanged")
+
+    soup = BeautifulSoup(response.content, "lxml")
+    options = extract_download_options(soup)
+    digest = options_digest(options)
+    db.save_metadata(amv_id, extract_metadata(soup))
+
+    if digest == entry["options_digest"]:
+        db.record_check(amv_id, digest, etag, last_modified)
+        return events.Rechecked(amv_id, "unchanged")
+
+    db.save_download_options(amv_id, options)
+
+    best = select_best_torrent(options)
+    if not best or entry["options_digest"] is None or best[1] <= (entry["size_mb"] or 0):
+        # No previous digest: just record the baseline
+        db.record_check(amv_id, digest, etag, last_modified)
+        return events.Rechecked(amv_id, "changed")
+
+    torrent_url, size_mb, resolution = best
+    if entry["state"] >= 2 and not reopen:
+        db.record_better_option(amv_id)
+        return events.Rechecked(amv_id, "better", entry["size_mb"], size_mb)
+
+    try:
+        filename, total_bytes = download_torrent(torrent_url, amv_id)
+    except (requests.RequestException, OSError, sqlite3.Error) as e:
+        # Don't record the new digest, so the next recheck tries again
+        db.record_check_error(amv_id)
+        return events.Rechecked(amv_id, "error", message=str(e))
+
+    db.set_torrent(
+        amv_id,
+        filename,
+        size_mb,
+        reopen=reopen,
+        total_bytes=total_bytes,
+        resolution=resolution,
+    )
+    db.record_check(amv_id, digest, etag, last_modified)
+    return events.Rechecked(amv_id, "upgraded", entry["size_mb"], size_mb)
+
+
+def iter_recheck(rows: Iterable, reopen: bool = False) -> Iterator[events.Event]:
+    """
+    Recheck the given AMVs (see recheck_entry).
+
+    Args:
+        rows: Rows (or an iterator over rows) from the database
+        reopen: See recheck_entry
+
+    Returns:
+        Iterator over one Rechecked event per row, then RecheckFinished
+    """
+    counts = {"unchanged": 0, "changed": 0, "better": 0, "upgraded": 0, "error": 0}
+    for i, entry in enumerate(rows):
+        if i:
+            # Rate limiting - be nice to the server
+            time.sleep(config.REQUEST_DELAY)
+
+        event = recheck_entry(entry, reopen=reopen)
+        counts[event.result] += 1
+        yield event
+
+    yield events.RecheckFinished(
+        counts["unchanged"],
+        counts["changed"],
+        counts["upgraded"],
+        counts["error"],
+        counts["better"],
+    )
+
+
+def iter_recheck_due(
+    limit: Optional[int] = None, reopen: bool = False
+) -> Iterator[events.Event]:
+    """
+    Recheck a batch of downloaded AMVs, newest first.
+
+    Only articles not checked within config.RECHECK_INTERVAL_DAYS are
+    considered, at most limit (default config.RECHECK_BATCH_SIZE) per run,
+    so that regular runs spread the work over time.
+
+    Args:
+        limit: Maximum number of articles to check
+        reopen: See recheck_entry
+
+    Returns:
+        Iterator over events, see iter_recheck
+    """
+    limit = limit or config.RECHECK_BATCH_SIZE
+    return iter_recheck(
+        db.get_recheck_candidates(limit, config.RECHECK_INTERVAL_DAYS), reopen=reopen
+    )
+
+
+def recheck_entries(
+    rows: Iterable, reopen: bool = False, sink: Optional[events.Sink] = None
+) -> int:
+    """
+    Recheck the given AMVs (see iter_recheck).
+
+    Args:
+        rows: Rows (or an iterator over rows) from the database
+        reopen: See recheck_entry
+        sink: Receives every event (default: print to stdout)
+
+    Returns:
+        Number of upgraded torrents
+    """
+    upgraded = 0
+    for event in events.emit(iter_recheck(rows, reopen), sink or events.PrintSink()):
+        if isinstance(event, events.RecheckFinished):
+            upgraded = event.upgraded
+    return upgraded
+
+
+def recheck_due(
+    limit: Optional[int] = None, reopen: bool = False, sink: Optional[events.Sink] = None
+) -> int:
+    """
+    Recheck a batch of AMVs that are due (see iter_recheck_due).
+
+    Args:
+        limit: Maximum number of articles to check
+        reopen: See recheck_entry
+        sink: Receives every event (default: print to stdout)
+
+    Returns:
+        Number of upgraded torrents
+    """
+    upgraded = 0
+    for event in events.emit(iter_recheck_due(limit, reopen), sink or events.PrintSink()):
+        if isinstance(event, events.RecheckFinished):
+            upgraded = event.upgraded
+    return upgraded
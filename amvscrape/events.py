@@ -0,0 +1,498 @@
+"""Typed progress events and sinks for the programmatic API.
+
+The work functions (scraper.iter_scrape, downloader.iter_download_pending,
+downloader.iter_recheck, client.iter_send, verify.iter_verify, ...) are
+generators that yield these events and print nothing. What happens with an
+event is up to the caller: the CLI passes them to a PrintSink, a service can
+feed them into its own pipeline.
+
+Example::
+
+    from amvscrape import downloader, events, scraper
+
+    for event in downloader.iter_download_pending(limit=100):
+        if isinstance(event, events.TorrentSaved):
+            ...
+
+    async for event in events.aiter_events(scraper.iter_scrape(max_pages=5)):
+        ...
+"""
+
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, TextIO, Tuple
+
+
+@dataclass(frozen=True)
+class Event:
+    """Base class of all events."""
+
+
+@dataclass(frozen=True)
+class ScrapeStarted(Event):
+    """
+    A scrape run starts.
+
+    max_pages is the requested limit (None for all pages), total_pages the
+    page count read from the pagination (None if not needed or unknown).
+    """
+
+    max_pages: Optional[int]
+    total_pages: Optional[int]
+    shard: Optional[Tuple[int, int]] = None
+
+
+@dataclass(frozen=True)
+class AmvInserted(Event):
+    """A new AMV was found on a listing page and added to the database."""
+
+    amv_id: str
+    article_url: str
+    page: int
+
+
+@dataclass(frozen=True)
+class PageScraped(Event):
+    """A listing page was processed (found == 0 ends the scrape)."""
+
+    page: int
+    found: int
+    new: int
+
+
+@dataclass(frozen=True)
+class ScrapeFinished(Event):
+    """A scrape run is complete."""
+
+    pages: int
+    new: int
+
+
+@dataclass(frozen=True)
+class DownloadStarted(Event):
+    """A download run starts; deferred AMVs wait for a retry or have no torrent."""
+
+    total: int
+    deferred: int = 0
+
+
+@dataclass(frozen=True)
+class TorrentSaved(Event):
+    """A torrent file was downloaded and stored, the AMV is in state 1."""
+
+    amv_id: str
+    filename: str
+    size_mb: float
+
+
+@dataclass(frozen=True)
+class Failure(Event):
+    """
+    Something failed for an AMV (or a listing page if amv_id is None).
+
+    reason is one of "fetch_error", "no_torrent", "torrent_error" (the
+    reasons stored by db.record_failure), "not_found" (unknown AMV ID) or
+    "error" (unexpected exception in a worker).
+    """
+
+    amv_id: Optional[str]
+    reason: str
+    message: str = ""
+    page: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class DownloadFinished(Event):
+    """A download run is complete."""
+
+    downloaded: int
+    total: int
+
+
+@dataclass(frozen=True)
+class Rechecked(Event):
+    """
+    An article was checked again (see downloader.recheck_entry).
+
+    result is "unchanged", "changed", "better", "upgraded" or "error"; for
+    "better" and "upgraded" the old and new size of the torrent are set.
+    """
+
+    amv_id: str
+    result: str
+    old_size_mb: Optional[float] = None
+    size_mb: Optional[float] = None
+    message: str = ""
+
+
+@dataclass(frozen=True)
+class RecheckFinished(Event):
+    """A recheck run is complete."""
+
+    unchanged: int
+    changed: int
+    upgraded: int
+    errors: int
+    better: int = 0
+
+
+@dataclass(frozen=True)
+class Skipped(Event):
+    """
+    An AMV was left out of a run.
+
+    reason is one of "no_torrent_file" (no torrent downloaded), "torrent_missing"
+    (torrent file not in the store, detail is its name), "not_in_database"
+    or "already_downloaded" (queued job for an AMV past state 0).
+    """
+
+    amv_id: str
+    reason: str
+    detail: str = ""
+
+
+@dataclass(frozen=True)
+class LeaseLost(Event):
+    """A worker lost the lease of its job; its result was not recorded."""
+
+    amv_id: str
+
+
+@dataclass(frozen=True)
+class TorrentQueued(Event):
+    """A torrent file will be handed to the torrent client."""
+
+    amv_id: str
+    filename: str
+
+
+@dataclass(frozen=True)
+class ClientStarted(Event):
+    """The torrent client (command) is called with the queued torrent files."""
+
+    command: str
+    files: int
+
+
+@dataclass(frozen=True)
+class TorrentsSent(Event):
+    """The torrent client accepted the files; updated AMVs are in state 2."""
+
+    command: str
+    sent: int
+    updated: int
+
+
+@dataclass(frozen=True)
+class LibraryScanned(Event):
+    """The library directory was scanned for files named after AMV IDs."""
+
+    found: int
+
+
+@dataclass(frozen=True)
+class Collected(Event):
+    """A library file matches an AMV (matched_as: ID without leading zeros)."""
+
+    amv_id: str
+    matched_as: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CheckLibFinished(Event):
+    """A library scan is complete, marked AMVs are in state 3."""
+
+    marked: int
+    found: int
+
+
+@dataclass(frozen=True)
+class Verified(Event):
+    """
+    The local files of an AMV were checked against its torrent.
+
+    status is "complete", "partial", "missing", "no torrent" or "invalid
+    torrent"; cached is True if the result was taken from the last run.
+    """
+
+    amv_id: str
+    status: str
+    pieces_ok: int
+    pieces_total: int
+    cached: bool = False
+    torrentfile: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class VerifyFinished(Event):
+    """A verify run is complete."""
+
+    complete: int
+    partial: int
+    missing: int
+    no_torrent: int
+    invalid: int
+
+
+@dataclass(frozen=True)
+class SnapshotMerged(Event):
+    """A snapshot file was merged (counts: see snapshot.merge_snapshot)."""
+
+    file: str
+    new: int
+    advanced: int
+    filled: int
+    options: int
+    metadata: int
+    torrents: int
+
+
+@dataclass(frozen=True)
+class SizesRead(Event):
+    """Torrent sizes were read from the stored torrent files."""
+
+    count: int
+
+
+@dataclass(frozen=True)
+class Planned(Event):
+    """An AMV fits into the budget; used_mb is the running total."""
+
+    amv_id: str
+    size_mb: float
+    resolution: Optional[str]
+    used_mb: float
+
+
+@dataclass(frozen=True)
+class PlanFinished(Event):
+    """
+    A plan is complete (candidates: AMVs in the selection, unknown: candidates
+    without a size, which are left out).
+    """
+
+    count: int
+    candidates: int
+    used_mb: float
+    budget_mb: float
+    unknown: int = 0
+
+
+Sink = Callable[[Event], None]
+
+
+def format_size(size_mb: float) -> str:
+    """Format a size in MB for output (e.g. "812.4 MB", "1.52 GB")."""
+    if size_mb >= 1024:
+        return f"{size_mb / 1024:.2f} GB"
+    return f"{size_mb:.1f} MB"
+
+
+_SKIP_TEXT = {
+    "no_torrent_file": "no torrent file available (skipped)",
+    "torrent_missing": "torrent file not found: {detail}",
+    "not_in_database": "not in database (skipped)",
+    "already_downloaded": "already downloaded (job skipped)",
+}
+
+
+def format_event(event: Event) -> Optional[str]:
+    """
+    Format an event as a line of terminal output.
+
+    Args:
+        event: Any event
+
+    Returns:
+        Text to print, or None for events that are not shown
+    """
+    if isinstance(event, ScrapeStarted):
+        text = ""
+        max_pages = event.max_pages or event.total_pages
+        if event.max_pages is None:
+            if event.total_pages:
+                text = f"Found {event.total_pages} total pages\n"
+            else:
+                text = "Could not determine total pages, will scrape until empty\n"
+                max_pages = 9999
+        if event.shard:
+            k, n = event.shard
+            return text + f"Starting scrape (max {max_pages} pages, shard {k}/{n})..."
+        return text + f"Starting scrape (max {max_pages} pages)..."
+    if isinstance(event, PageScraped):
+        if not event.found:
+            return f"Scraping page {event.page}... no results, stopping."
+        return f"Scraping page {event.page}... found {event.found} AMVs ({event.new} new)"
+    if isinstance(event, ScrapeFinished):
+        return f"\nScraping complete. {event.new} new AMVs added to database."
+    if isinstance(event, DownloadStarted):
+        lines = []
+        if event.deferred:
+            lines.append(f"Skipping {event.deferred} AMVs (no torrent or waiting for retry)")
+        if event.total:
+            lines.append(f"Found {event.total} AMVs to download\n")
+        else:
+            lines.append("No pending AMVs to download")
+        return "\n".join(lines)
+    if isinstance(event, TorrentSaved):
+        return f"AMV {event.amv_id}: {event.size_mb:.2f} MB torrent saved"
+    if isinstance(event, Failure):
+        message = f": {event.message}" if event.message else ""
+        if event.amv_id is None:
+            return f"Scraping page {event.page}... failed ({event.reason}){message}"
+        return f"AMV {event.amv_id}: FAILED ({event.reason}){message}"
+    if isinstance(event, DownloadFinished):
+        return f"\nDownloaded {event.downloaded}/{event.total} torrents successfully"
+    if isinstance(event, Rechecked):
+        if event.result == "upgraded":
+            return (
+                f"AMV {event.amv_id}: better torrent saved "
+                f"({event.old_size_mb or 0:.2f} → {event.size_mb:.2f} MB)"
+            )
+        if event.result == "better":
+            return (
+                f"AMV {event.amv_id}: better torrent available "
+                f"({event.old_size_mb or 0:.2f} → {event.size_mb:.2f} MB), "
+                "kept the sent one (use --reopen to replace it)"
+            )
+        message = f" ({event.message})" if event.message else ""
+        return f"AMV {event.amv_id}: {event.result}{message}"
+    if isinstance(event, RecheckFinished):
+        total = event.unchanged + event.changed + event.upgraded + event.errors
+        if not total + event.better:
+            return "No AMVs due for recheck"
+        better = f"{event.better} better available, " if event.better else ""
+        return (
+            f"\nRecheck done: {event.upgraded} upgraded, {better}{event.changed} "
+            f"changed, {event.unchanged} unchanged, {event.errors} errors"
+        )
+    if isinstance(event, Skipped):
+        text = _SKIP_TEXT.get(event.reason, event.reason).format(detail=event.detail)
+        return f"  {event.amv_id} → {text}"
+    if isinstance(event, LeaseLost):
+        return f"AMV {event.amv_id}: lease lost, result not recorded"
+    if isinstance(event, TorrentQueued):
+        return f"  {event.amv_id} → {event.filename}"
+    if isinstance(event, ClientStarted):
+        return f"\nCalling {event.command} with {event.files} torrent file(s)..."
+    if isinstance(event, TorrentsSent):
+        return (
+            f"✓ Sent {event.sent} torrent(s) to {event.command}\n"
+            f"✓ Updated {event.updated} AMV(s) to state=2 (sent to client)"
+        )
+    if isinstance(event, LibraryScanned):
+        if not event.found:
+            return "No AMV files found in library (no files starting with 5-digit ID)"
+        return f"Found {event.found} AMV files in library"
+    if isinstance(event, Collected):
+        if event.matched_as:
+            return f"  {event.amv_id} → marked as collected (matched as {event.matched_as})"
+        return f"  {event.amv_id} → marked as collected"
+    if isinstance(event, CheckLibFinished):
+        if not event.found:
+            return None
+        return f"\n✓ Marked {event.marked}/{event.found} AMVs as collected (state=3)"
+    if isinstance(event, Verified):
+        if event.status == "no torrent":
+            return f"  {event.amv_id} → no torrent file (skipped)"
+        if event.status == "invalid torrent":
+            return f"  {event.amv_id} → invalid torrent file {event.torrentfile} (skipped)"
+        suffix = " (cached)" if event.cached else ""
+        return (
+            f"  {event.amv_id} → {event.status} "
+            f"({event.pieces_ok}/{event.pieces_total} pieces){suffix}"
+        )
+    if isinstance(event, VerifyFinished):
+        text = (
+            f"\n✓ {event.complete} complete, {event.partial} partial, "
+            f"{event.missing} missing, {event.no_torrent} without torrent"
+        )
+        if event.invalid:
+            text += f"\n✗ {event.invalid} invalid torrent file(s)"
+        return text
+    if isinstance(event, SnapshotMerged):
+        return (
+            f"Merged {event.file}: {event.new} new, {event.advanced} advanced, "
+            f"{event.filled} filled, {event.options} download options, "
+            f"{event.metadata} metadata entries, {event.torrents} torrent files"
+        )
+    if isinstance(event, SizesRead):
+        return f"Read the size of {event.count} torrent(s) from their metadata"
+    if isinstance(event, Planned):
+        return (
+            f"  {event.amv_id:>8} | {format_size(event.size_mb):>10} | "
+            f"{event.resolution or '?':>9} | total {format_size(event.used_mb)}"
+        )
+    if isinstance(event, PlanFinished):
+        if not event.candidates:
+            return "  (no AMVs with state=1 in the selection)"
+        text = (
+            f"\n{event.count} of {event.candidates} AMVs fit: "
+            f"{format_size(event.used_mb)} used, "
+            f"{format_size(event.budget_mb - event.used_mb)} left"
+        )
+        if event.unknown:
+            text += f"\n✗ {event.unknown} AMV(s) of unknown size left out"
+        return text
+    return None
+
+
+class PrintSink:
+    """Sink that prints events as terminal output (used by the CLI)."""
+
+    def __init__(self, file: Optional[TextIO] = None):
+        self.file = file
+
+    def __call__(self, event: Event) -> None:
+        text = format_event(event)
+        if text is not None:
+            print(text, file=self.file or sys.stdout, flush=True)
+
+
+def null_sink(event: Event) -> None:
+    """Sink that ignores all events."""
+
+
+def emit(events: Iterable[Event], sink: Optional[Sink]) -> Iterator[Event]:
+    """
+    Pass every event to a sink and yield it on.
+
+    Args:
+        events: Events from one of the iter_* functions
+        sink: Callable receiving each event, None for no output
+
+    Returns:
+        Iterator over the same events
+    """
+    for event in events:
+        if sink is not None:
+            sink(event)
+        yield event
+
+
+async def aiter_events(events: Iterable[Event]) -> AsyncIterator[Event]:
+    """
+    Consume an event generator from asyncio code.
+
+    The generator runs in a worker thread (always the same one, so database
+    connections stay on one thread); the event loop is not blocked by
+    network or database I/O.
+
+    Args:
+        events: Events from one of the iter_* functions
+
+    Returns:
+        Async iterator over the events
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(events)
+    done = object()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            event = await loop.run_in_executor(executor, next, iterator, done)
+            if event is done:
+                return
+            yield event
@@ -0,0 +1,67 @@
+"""Mark AMVs whose video files are already in the local collection."""
+
+import re
+from pathlib import Path
+from typing import Iterator, List
+
+from . import db, events
+
+# Library files start with the 5-digit AMV ID, e.g. "09938.mkv"
+_FILE_ID_RE = re.compile(r"^(\d{5})\.")
+
+
+def scan_ids(path: Path) -> List[str]:
+    """
+    Find AMV IDs in the file names of a library directory.
+
+    Args:
+        path: Library directory
+
+    Returns:
+        IDs as found in the file names (with leading zeros)
+    """
+    found_ids = []
+    for file_path in Path(path).iterdir():
+        if file_path.is_file():
+            match = _FILE_ID_RE.match(file_path.name)
+            if match:
+                found_ids.append(match.group(1))
+    return found_ids
+
+
+def iter_checklib(path: Path) -> Iterator[events.Event]:
+    """
+    Mark the AMVs found in a library directory as collected (state 3).
+
+    IDs are matched exactly first, then without leading zeros (e.g. file
+    "09938.mkv" and AMV "9938"). All matches are marked in one transaction.
+
+    Args:
+        path: Library directory
+
+    Returns:
+        Iterator over events: LibraryScanned, one Collected or Skipped per
+        file, then CheckLibFinished
+    """
+    found_ids = scan_ids(path)
+    yield events.LibraryScanned(len(found_ids))
+    if not found_ids:
+        yield events.CheckLibFinished(0, 0)
+        return
+
+    collected_ids = []
+    for amv_id in found_ids:
+        if db.id_exists(amv_id):
+            collected_ids.append(amv_id)
+            yield events.Collected(amv_id)
+            continue
+
+        amv_id_stripped = amv_id.lstrip("0") or "0"
+        if amv_id_stripped != amv_id and db.id_exists(amv_id_stripped):
+            collected_ids.append(amv_id_stripped)
+            yield events.Collected(amv_id, amv_id_stripped)
+        else:
+            yield events.Skipped(amv_id, "not_in_database")
+
+    db.transition_states(collected_ids, 3)
+    yield events.CheckLibFinished(len(collected_ids), len(found_ids))
@@ -0,0 +1,128 @@
+"""Plan which ready torrents fit into a disk budget."""
+
+from typing import Iterator, Sequence
+
+from . import db, downloader, events, selection, store
+
+# Planning policies (names of db.ORDERS): the order in which AMVs are
+# considered; AMVs that don't fit into the remaining budget are skipped
+POLICIES = ("smallest", "newest", "resolution")
+
+
+def fill_total_bytes(where: str = "1", params: Sequence = ()) -> int:
+    """
+    Read the total size from the stored torrents of AMVs that don't have it yet.
+
+    AMVs downloaded before sizes were stored only have the size shown on
+    the article page; the torrent metadata is exact.
+
+    Args:
+        where: SQL condition selecting the AMVs (e.g. from compile_selection)
+        params: Parameters for the condition
+
+    Returns:
+        Number of AMVs updated
+    """
+    torrent_store = store.get_store()
+    missing = f"({where}) AND total_bytes IS NULL AND torrentfile IS NOT NULL"
+
+    filled = 0
+    for chunk in db.iter_amv_chunks(missing, params):
+        stored = torrent_store.existing(row["torrentfile"] for row in chunk)
+        sizes = []
+        for row in chunk:
+            if row["torrentfile"] not in stored:
+                continue
+            total_bytes = downloader.torrent_total_bytes(
+                torrent_store.read(row["torrentfile"])
+            )
+            if total_bytes is not None:
+                sizes.append((row["id"], total_bytes))
+        db.set_total_bytes(sizes)
+        filled += len(sizes)
+
+    return filled
+
+
+def count_unknown_sizes(where: str = "1", params: Sequence = ()) -> int:
+    """
+    Count the AMVs whose size is not known (left out of every budget).
+
+    Args:
+        where: SQL condition selecting the AMVs (e.g. from compile_selection)
+        params: Parameters for the condition
+
+    Returns:
+        Number of AMVs without total_bytes and size_mb
+    """
+    return db.count_amvs(f"({where}) AND {selection.SIZE_EXPR} IS NULL", params)
+
+
+def plan_rows(
+    where: str, params: Sequence, budget_mb: float, policy: str = "smallest"
+) -> Iterator:
+    """
+    Choose AMVs that fit into a disk budget.
+
+    Args:
+        where: SQL condition selecting the candidates (e.g. state=1)
+        params: Parameters for the condition
+        budget_mb: Total budget in MB
+        policy: One of POLICIES: "smallest" (as many AMVs as possible),
+            "newest" or "resolution" (most pixels per GB first)
+
+    Returns:
+        Iterator over the chosen rows, in policy order (AMVs of unknown
+        size are left out, see count_unknown_sizes)
+
+    Raises:
+        ValueError: If the policy is unknown
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy: '{policy}' (use one of {POLICIES})")
+
+    rows = db.iter_amvs(where, params, order=policy)
+    return selection.limit_budget(rows, budget_mb)
+
+
+def iter_plan(
+    where: str, params: Sequence, budget_mb: float, policy: str = "smallest"
+) -> Iterator[events.Event]:
+    """
+    Plan which AMVs fit into a disk budget (see plan_rows), without sending them.
+
+    Missing torrent sizes are read from the stored torrents first (see
+    fill_total_bytes).
+
+    Args:
+        where: SQL condition selecting the candidates (e.g. state=1)
+        params: Parameters for the condition
+        budget_mb: Total budget in MB
+        policy: One of POLICIES
+
+    Returns:
+        Iterator over events: SizesRead (if sizes were read), one Planned per
+        chosen AMV, then PlanFinished
+
+    Raises:
+        ValueError: If the policy is unknown
+    """
+    filled = fill_total_bytes(where, params)
+    if filled:
+        yield events.SizesRead(filled)
+
+    count = 0
+    used_mb = 0.0
+    for row in plan_rows(where, params, budget_mb, policy):
+        size_mb = selection.row_size_mb(row)
+        count += 1
+        used_mb += size_mb
+        yield events.Planned(row["id"], size_mb, row["resolution"], used_mb)
+
+    yield events.PlanFinished(
+        count,
+        db.count_amvs(where, params),
+        used_mb,
+        budget_mb,
+        count_unknown_sizes(where, params),
+    )
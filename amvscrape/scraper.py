@@ -2,13 +2,13 @@
 
 import re
 import time
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import requests
 from bs4 import BeautifulSoup
 
-from . import config, db
+from . import config, db, events
 
 
 def scrape_listing_page(page_num: int) -> List[Tuple[str, str]]:
@@ -20,6 +20,9 @@ def scrape_listing_page(page_num: int) -> List[Tuple[str, str]]:
 
     Returns:
         List of (amv_id, article_url) tuples
+
+    Raises:
+        requests.RequestException: If the page could not be fetched
     """
     # Construct paginated URL
     # Pagination works in steps of 10: no param for page 1, page=10 for page 2, page=20 for page 3, etc.
@@ -35,12 +38,8 @@ def scrape_listing_page(page_num: int) -> List[Tuple[str, str]]:
         "Accept-Language": "en-US,en;q=0.5",
     }
 
-    try:
-        response = requests.get(url, headers=headers, timeout=config.REQUEST_TIMEOUT)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching page {page_num}: {e}")
-        return []
+    response = requests.get(url, headers=headers, timeout=config.REQUEST_TIMEOUT)
+    response.raise_for_status()
 
     soup = BeautifulSoup(response.content, "lxml")
     results = []
@@ -98,8 +97,7 @@ def get_total_pages() -> Optional[int]:
             config.NEWS_URL, headers=headers, timeout=config.REQUEST_TIMEOUT
         )
         response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching pagination info: {e}")
+    except requests.RequestException:
         return None
 
     soup = BeautifulSoup(response.content, "lxml")
@@ -126,53 +124,78 @@ def get_total_pages() -> Optional[int]:
     return 1
 
 
-def scrape_all(max_pages: Optional[int] = None) -> int:
+def iter_scrape(
+    max_pages: Optional[int] = None, shard: Optional[Tuple[int, int]] = None
+) -> Iterator[events.Event]:
     """
     Scrape all (or max_pages) listing pages and insert into database.
 
+    Stops at the first page without results (or that can't be fetched).
+
     Args:
         max_pages: Maximum number of pages to scrape, None for all
+        shard: (k, n) to only scrape every n-th page starting at page k,
+            so that n nodes can split a full scrape
 
     Returns:
-        Number of new AMVs found
+        Iterator over events: ScrapeStarted, then AmvInserted for every new
+        AMV and PageScraped (or Failure) for every page, then ScrapeFinished
     """
     new_count = 0
-    page = 1
+    pages = 0
+    page, step = (shard[0], shard[1]) if shard else (1, 1)
 
     # If max_pages not specified, try to determine total
-    if max_pages is None:
-        total = get_total_pages()
-        if total:
-            print(f"Found {total} total pages")
-            max_pages = total
-        else:
-            print("Could not determine total pages, will scrape until empty")
-            max_pages = 9999  # Arbitrary large number
-
-    print(f"Starting scrape (max {max_pages} pages)...")
-
-    while page <= max_pages:
-        print(f"Scraping page {page}...", end=" ", flush=True)
-
-        results = scrape_listing_page(page)
-
-        if not results:
-            print("no results, stopping.")
+    total_pages = get_total_pages() if max_pages is None else None
+    yield events.ScrapeStarted(max_pages, total_pages, shard)
+
+    last_page = max_pages or total_pages or 9999  # Arbitrary large number
+    while page <= last_page:
+        try:
+            results = scrape_listing_page(page)
+        except requests.RequestException as e:
+            yield events.Failure(None, "fetch_error", str(e), page=page)
             break
 
+        pages += 1
         page_new = 0
         for amv_id, article_url in results:
             if db.insert_amv(amv_id, article_url):
                 page_new += 1
                 new_count += 1
+                yield events.AmvInserted(amv_id, article_url, page)
 
-        print(f"found {len(results)} AMVs ({page_new} new)")
+        yield events.PageScraped(page, len(results), page_new)
+        if not results:
+            break
 
-        page += 1
+        page += step
 
         # Rate limiting - be nice to the server
-        if page <= max_pages:
+        if page <= last_page:
             time.sleep(config.REQUEST_DELAY)
 
-    print(f"\nScraping complete. {new_count} new AMVs added to database.")
+    yield events.ScrapeFinished(pages, new_count)
+
+
+def scrape_all(
+    max_pages: Optional[int] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    sink: Optional[events.Sink] = None,
+) -> int:
+    """
+    Scrape listing pages (see iter_scrape) and report progress to a sink.
+
+    Args:
+        max_pages: Maximum number of pages to scrape, None for all
+        shard: (k, n) to only scrape every n-th page, see iter_scrape
+        sink: Receives every event (default: print to stdout)
+
+    Returns:
+        Number of new AMVs found
+    """
+    new_count = 0
+    for event in events.emit(iter_scrape(max_pages, shard), sink or events.PrintSink()):
+        if isinstance(event, events.ScrapeFinished):
+            new_count = event.new
     return new_count
@@ -0,0 +1,336 @@
+"""ID selection language shared by the `torrent`, `download` and `list` commands.
+
+A selection is a list of specs (one per CLI argument). Each spec is one or
+more comma separated terms:
+
+- Single ID: "12345" (numeric match, leading zeros don't matter)
+- Range: "8000-9000" (inclusive)
+- Greater/less than: ">9000", "<500"
+- State filter: "state=1" or "state=0|1"
+- Size filter: "size<500", "size>1.5G" (MB unless a unit is given; AMVs of
+  unknown size match neither)
+- Shard filter: "shard=2/4" (second of four ID hash partitions)
+- Negation: "!" in front of any term, e.g. "!8000-8100" or "!state=3"
+
+ID terms are combined with OR, filters and negated terms with AND. The whole
+selection compiles into a single parameterized WHERE clause.
+"""
+
+import json
+import re
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .db import ALLOWED_TRANSITIONS
+
+# Numeric view of the TEXT id column (handles leading zeros)
+ID_EXPR = "CAST(id AS INTEGER)"
+
+# Download size in MB: from the torrent metadata if known, else the size shown
+# on the article page; NULL if neither is known (same as row_size_mb)
+SIZE_EXPR = "COALESCE(total_bytes / 1048576.0, size_mb)"
+
+_NUMBER_RE = re.compile(r"\d+")
+_RANGE_RE = re.compile(r"^(\d+)-(\d+)$")
+_THRESHOLD_RE = re.compile(r"^([<>])\s*(\d+)$")
+_STATE_RE = re.compile(r"^state\s*=\s*(\d+(?:\s*\|\s*\d+)*)$", re.IGNORECASE)
+_SIZE_RE = re.compile(r"^size\s*([<>])\s*(.+)$", re.IGNORECASE)
+_SHARD_RE = re.compile(r"^shard\s*=\s*(\d+/\d+)$", re.IGNORECASE)
+_SIZE_VALUE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([kmgt]i?b?)?$", re.IGNORECASE)
+
+_SIZE_UNITS_MB = {
+    "k": 1 / 1024,
+    "m": 1,
+    "g": 1024,
+    "t": 1024 * 1024,
+}
+
+
+class SelectionError(ValueError):
+    """Raised for specs that don't match the selection grammar."""
+
+
+def parse_size_mb(text: str) -> float:
+    """
+    Parse a human size like "500", "500M", "1.5G" or "2TB" into megabytes.
+
+    Args:
+        text: Size text (plain numbers are MB)
+
+    Returns:
+        Size in megabytes
+
+    Raises:
+        SelectionError: If the text is not a valid size
+    """
+    match = _SIZE_VALUE_RE.match(text.strip())
+    if not match:
+        raise SelectionError(f"invalid size: '{text}'")
+
+    value = float(match.group(1))
+    unit = (match.group(2) or "m")[0].lower()
+    return value * _SIZE_UNITS_MB[unit]
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """
+    Parse a shard spec "k/n" (1 <= k <= n).
+
+    Args:
+        text: Shard spec, e.g. "2/4"
+
+    Returns:
+        (k, n) tuple
+
+    Raises:
+        SelectionError: If the spec is invalid
+    """
+    parts = text.strip().split("/")
+    if len(parts) != 2 or not all(_NUMBER_RE.fullmatch(part) for part in parts):
+        raise SelectionError(f"invalid shard: '{text}' (expected k/n, e.g. 1/4)")
+
+    k, n = int(parts[0]), int(parts[1])
+    if not 1 <= k <= n:
+        raise SelectionError(f"invalid shard: '{text}' (k must be between 1 and n)")
+    return k, n
+
+
+def shard_sql(k: int, n: int) -> Tuple[str, list]:
+    """
+    SQL condition selecting the k-th of n ID hash partitions.
+
+    Uses a multiplicative hash of the numeric ID so that consecutive IDs
+    (and thus newest/oldest AMVs) are spread evenly over all shards.
+
+    Args:
+        k: Shard number (1-based)
+        n: Number of shards
+
+    Returns:
+        (sql, params) tuple
+    """
+    return f"(({ID_EXPR} * 2654435761) % 4294967296) % ? = ?", [n, k - 1]
+
+
+def parse_term(term: str) -> Tuple[bool, tuple]:
+    """
+    Parse a single selection term.
+
+    Args:
+        term: Term text, e.g. "12345", "!8000-9000", "state=1"
+
+    Returns:
+        (negated, term) where term is one of
+        ("id", n), ("range", lo, hi), ("gt", n), ("lt", n),
+        ("state", [states]), ("size", op, mb), ("shard", k, n)
+
+    Raises:
+        SelectionError: If the term is not recognized
+    """
+    text = term.strip()
+    negated = text.startswith("!")
+    if negated:
+        text = text[1:].strip()
+
+    # Not str.isdigit(): that accepts characters like "²" which int() rejects
+    if _NUMBER_RE.fullmatch(text):
+        return negated, ("id", int(text))
+
+    match = _RANGE_RE.match(text)
+    if match:
+        lo, hi = int(match.group(1)), int(match.group(2))
+        if lo > hi:
+            raise SelectionError(f"empty range: '{term}'")
+        return negated, ("range", lo, hi)
+
+    match = _THRESHOLD_RE.match(text)
+    if match:
+        kind = "gt" if match.group(1) == ">" else "lt"
+        return negated, (kind, int(match.group(2)))
+
+    match = _STATE_RE.match(text)
+    if match:
+        states = [int(s) for s in match.group(1).split("|")]
+        unknown = [s for s in states if s not in ALLOWED_TRANSITIONS]
+        if unknown:
+            raise SelectionError(
+                f"unknown state {unknown[0]} in '{term}' (use 0, 1, 2 or 3)"
+            )
+        return negated, ("state", states)
+
+    match = _SIZE_RE.match(text)
+    if match:
+        return negated, ("size", match.group(1), parse_size_mb(match.group(2)))
+
+    match = _SHARD_RE.match(text)
+    if match:
+        return negated, ("shard",) + parse_shard(match.group(1))
+
+    raise SelectionError(f"unrecognized selection term: '{term}'")
+
+
+def parse_specs(specs: Sequence[str]) -> List[Tuple[bool, tuple]]:
+    """
+    Split specs into comma separated terms and parse them.
+
+    Args:
+        specs: Selection specs as given on the command line
+
+    Returns:
+        List of (negated, term) tuples
+    """
+    terms = []
+    for spec in specs:
+        for part in spec.split(","):
+            if part.strip():
+                terms.append(parse_term(part))
+    return terms
+
+
+def explicit_ids(specs: Sequence[str]) -> List[int]:
+    """
+    Get the explicitly listed (not negated) single IDs of a selection.
+
+    Args:
+        specs: Selection specs as given on the command line
+
+    Returns:
+        List of numeric IDs in the order given
+
+    Raises:
+        SelectionError: If a spec is not recognized
+    """
+    return [t[1] for neg, t in parse_specs(specs) if not neg and t[0] == "id"]
+
+
+def _term_sql(term: tuple) -> Tuple[str, list]:
+    """Compile a single non-ID-list term into SQL and params."""
+    kind = term[0]
+    if kind == "range":
+        return f"{ID_EXPR} BETWEEN ? AND ?", [term[1], term[2]]
+    if kind == "gt":
+        return f"{ID_EXPR} > ?", [term[1]]
+    if kind == "lt":
+        return f"{ID_EXPR} < ?", [term[1]]
+    if kind == "state":
+        placeholders = ", ".join("?" for _ in term[1])
+        return f"state IN ({placeholders})", list(term[1])
+    if kind == "size":
+        return f"{SIZE_EXPR} {term[1]} ?", [term[2]]
+    if kind == "shard":
+        return shard_sql(term[1], term[2])
+    raise SelectionError(f"unknown term kind: {kind}")
+
+
+def _id_list_sql(ids: List[int]) -> Tuple[str, list]:
+    """Compile an ID list into one IN clause with a single JSON parameter."""
+    return f"{ID_EXPR} IN (SELECT value FROM json_each(?))", [json.dumps(ids)]
+
+
+def compile_selection(
+    specs: Sequence[str], default_state: Optional[int] = None
+) -> Tuple[str, list]:
+    """
+    Compile selection specs into a WHERE clause.
+
+    Args:
+        specs: Selection specs (empty selects everything)
+        default_state: State applied to everything except explicitly listed
+            IDs when the selection has no state filter of its own
+
+    Returns:
+        (where_sql, params) - where_sql is "1" if nothing is filtered
+
+    Raises:
+        SelectionError: If a spec is not recognized
+    """
+    terms = parse_specs(specs)
+
+    ids = [t[1] for neg, t in terms if not neg and t[0] == "id"]
+    open_terms = [t for neg, t in terms if not neg and t[0] in ("range", "gt", "lt")]
+    filters = [
+        t for neg, t in terms if not neg and t[0] in ("state", "size", "shard")
+    ]
+    excluded_ids = [t[1] for neg, t in terms if neg and t[0] == "id"]
+    negated = [t for neg, t in terms if neg and t[0] != "id"]
+
+    has_state_filter = any(t[0] == "state" for neg, t in terms)
+    state_default = default_state if not has_state_filter else None
+
+    clauses = []
+    params: list = []
+
+    # Positive ID terms: explicit IDs OR open selectors (ranges/thresholds)
+    id_parts = []
+    if ids:
+        sql, p = _id_list_sql(ids)
+        id_parts.append(sql)
+        params.extend(p)
+    if open_terms:
+        open_sql = []
+        for term in open_terms:
+            sql, p = _term_sql(term)
+            open_sql.append(sql)
+            params.extend(p)
+        sql = " OR ".join(open_sql)
+        if state_default is not None:
+            sql = f"({sql}) AND state = ?"
+            params.append(state_default)
+        id_parts.append(f"({sql})")
+    if id_parts:
+        clauses.append("(" + " OR ".join(id_parts) + ")")
+    elif state_default is not None:
+        clauses.append("state = ?")
+        params.append(state_default)
+
+    for term in filters:
+        sql, p = _term_sql(term)
+        clauses.append(sql)
+        params.extend(p)
+
+    if excluded_ids:
+        sql, p = _id_list_sql(excluded_ids)
+        clauses.append(f"NOT ({sql})")
+        params.extend(p)
+
+    for term in negated:
+        sql, p = _term_sql(term)
+        clauses.append(f"NOT ({sql})")
+        params.extend(p)
+
+    return (" AND ".join(clauses) or "1"), params
+
+
+def row_size_mb(row) -> Optional[float]:
+    """
+    Download size of an AMV row in MB.
+
+    Uses total_bytes from the torrent metadata if known, else the size shown
+    on the article page (None if neither is known, see SIZE_EXPR).
+    """
+    if row["total_bytes"] is not None:
+        return row["total_bytes"] / (1024 * 1024)
+    return row["size_mb"]
+
+
+def limit_budget(rows: Iterable, budget_mb: float) -> Iterator:
+    """
+    Pass rows through until their sizes add up to the budget.
+
+    Rows that don't fit into the remaining budget are skipped, later smaller
+    ones may still fit. Sizes are taken from row_size_mb; rows of unknown
+    size are skipped too, as they could be any size (count them with
+    SIZE_EXPR IS NULL to report them).
+
+    Args:
+        rows: Rows with size_mb and total_bytes columns (e.g. from db.iter_amvs)
+        budget_mb: Total budget in MB
+
+    Returns:
+        Iterator over the rows that fit
+    """
+    used = 0.0
+    for row in rows:
+        size_mb = row_size_mb(row)
+        if size_mb is not None and used + size_mb <= budget_mb:
+            used += size_mb
+            yield row
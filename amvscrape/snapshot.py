@@ -0,0 +1,265 @@
+"""Export and merge database snapshots for crawling on several machines.
+
+A snapshot is a single SQLite file with the ``amvs``, ``download_options``
+and ``amv_meta`` rows of a node plus the referenced torrent files (``torrents`` table with
+one BLOB per file).
+
+Merging is idempotent and never moves an AMV backwards:
+
+- Unknown AMVs are inserted as they are.
+- If the snapshot has a higher state, its fields win; NULL fields in the
+  snapshot (e.g. no torrent file) keep the local value, and its torrent file
+  replaces the local one.
+- New AMVs, state changes and filled in torrents are written to ``state_log``.
+- With equal states, a missing torrent file is filled in from the snapshot and
+  the failure info with more attempts wins.
+- Lower states in the snapshot are ignored.
+- Metadata for the search index is only taken for AMVs without local metadata.
+- Other torrent files are only copied if they are missing locally.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+from . import db, events, store
+
+# Failure info is taken from the winning row as it is (NULL means no failure)
+_FAILURE_COLUMNS = ("fail_reason", "fail_count", "next_retry_at")
+
+# Columns describing the torrent file, only taken with a torrent from the snapshot
+_TORRENT_COLUMNS = ("total_bytes", "resolution")
+
+
+def _common_columns(conn, table: str) -> List[str]:
+    """Columns of a table that exist in both the main DB and the snapshot."""
+    main_cols = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    snap_cols = {row[1] for row in conn.execute(f"PRAGMA snap.table_info({table})")}
+    return [col for col in main_cols if col in snap_cols]
+
+
+def export_snapshot(path: Path, where: str = "1", params: Sequence = ()) -> Dict[str, int]:
+    """
+    Write the selected AMVs with their download options and torrents to a new file.
+
+    Args:
+        path: Snapshot file to create (must not exist)
+        where: SQL condition selecting the AMVs (e.g. from compile_selection)
+        params: Parameters for the condition
+
+    Returns:
+        Dict with counts for "amvs", "options", "metadata" and "torrents"
+
+    Raises:
+        FileExistsError: If the snapshot file already exists
+    """
+    path = Path(path)
+    if path.exists():
+        raise FileExistsError(f"snapshot file already exists: {path}")
+
+    torrent_store = store.get_store()
+
+    with db.get_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS snap", (str(path),))
+
+        conn.execute("CREATE TABLE snap.amvs AS SELECT * FROM main.amvs WHERE 0")
+        amv_count = conn.execute(
+            f"INSERT INTO snap.amvs SELECT * FROM main.amvs WHERE {where}",
+            tuple(params),
+        ).rowcount
+
+        conn.execute(
+            "CREATE TABLE snap.download_options AS SELECT * FROM main.download_options WHERE 0"
+        )
+        option_count = conn.execute(
+            "INSERT INTO snap.download_options SELECT o.* FROM main.download_options o "
+            "WHERE o.amv_id IN (SELECT id FROM snap.amvs)"
+        ).rowcount
+
+        conn.execute("CREATE TABLE snap.amv_meta AS SELECT * FROM main.amv_meta WHERE 0")
+        meta_count = conn.execute(
+            "INSERT INTO snap.amv_meta SELECT m.* FROM main.amv_meta m "
+            "WHERE m.amv_id IN (SELECT id FROM snap.amvs)"
+        ).rowcount
+
+        conn.execute(
+            "CREATE TABLE snap.torrents (name TEXT PRIMARY KEY, data BLOB NOT NULL)"
+        )
+        names = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT torrentfile FROM snap.amvs WHERE torrentfile IS NOT NULL"
+            )
+        ]
+        stored = torrent_store.existing(names)
+        conn.executemany(
+            "INSERT INTO snap.torrents (name, data) VALUES (?, ?)",
+            ((name, torrent_store.read(name)) for name in names if name in stored),
+        )
+
+    return {
+        "amvs": amv_count,
+        "options": option_count,
+        "metadata": meta_count,
+        "torrents": len(stored),
+    }
+
+
+def merge_snapshot(path: Path) -> Dict[str, int]:
+    """
+    Merge a snapshot into the local database and torrent store.
+
+    Args:
+        path: Snapshot file created by export_snapshot
+
+    Returns:
+        Dict with counts for "new", "advanced", "filled", "options", "metadata"
+        and "torrents"
+
+    Raises:
+        FileNotFoundError: If the snapshot file does not exist
+    """
+    path = Path(path)
+    if not path.is_file():
+        raise FileNotFoundError(f"snapshot file not found: {path}")
+
+    torrent_store = store.get_store()
+
+    with db.get_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS snap", (str(path),))
+
+        cols = _common_columns(conn, "amvs")
+        col_list = ", ".join(cols)
+        updatable = [col for col in cols if col not in ("id", "article_url")]
+        snap_match = "FROM snap.amvs s WHERE s.id = amvs.id"
+
+        # Torrent files of rows where the snapshot wins replace local files
+        winning = {
+            row[0]
+            for row in conn.execute("""
+                SELECT s.torrentfile FROM snap.amvs s LEFT JOIN main.amvs m ON m.id = s.id
+                WHERE s.torrentfile IS NOT NULL AND (m.id IS NULL OR s.state > m.state)
+            """)
+        }
+
+        # Log new AMVs, state changes and filled in torrents before applying them
+        conn.execute("""
+            INSERT INTO main.state_log (amv_id, old_state, new_state, change)
+            SELECT s.id, COALESCE(m.state, s.state), s.state,
+                   CASE WHEN m.id IS NULL THEN 'insert'
+                        WHEN s.state > m.state THEN 'state'
+                        ELSE 'torrent' END
+            FROM snap.amvs s LEFT JOIN main.amvs m ON m.id = s.id
+            WHERE m.id IS NULL OR s.state > m.state OR (
+                s.state = m.state AND m.torrentfile IS NULL AND s.torrentfile IS NOT NULL
+            )
+        """)
+
+        new_count = conn.execute(
+            f"INSERT OR IGNORE INTO main.amvs ({col_list}) SELECT {col_list} FROM snap.amvs"
+        ).rowcount
+
+        # Snapshot is further along: take the row, but don't let unknown
+        # (NULL) values overwrite what is known locally
+        values = []
+        for col in updatable:
+            if col in _FAILURE_COLUMNS or col == "state":
+                values.append(f"s.{col}")
+            elif col in _TORRENT_COLUMNS:
+                values.append(
+                    f"CASE WHEN s.torrentfile IS NOT NULL THEN s.{col} ELSE amvs.{col} END"
+                )
+            else:
+                values.append(f"COALESCE(s.{col}, amvs.{col})")
+        advanced_count = conn.execute(
+            f"UPDATE main.amvs SET ({', '.join(updatable)}) = "
+            f"(SELECT {', '.join(values)} {snap_match}) "
+            f"WHERE EXISTS (SELECT 1 {snap_match} AND s.state > amvs.state)"
+        ).rowcount
+
+        # Same state: fill in a missing torrent file (and what is known about it)
+        torrent_cols = [col for col in _TORRENT_COLUMNS if col in cols]
+        torrent_fill = "".join(
+            f", {col} = (SELECT s.{col} {snap_match})" for col in torrent_cols
+        )
+        filled_count = conn.execute(f"""
+            UPDATE main.amvs SET
+                torrentfile = (SELECT s.torrentfile {snap_match}),
+                size_mb = COALESCE(size_mb, (SELECT s.size_mb {snap_match})){torrent_fill}
+            WHERE torrentfile IS NULL AND EXISTS (
+                SELECT 1 {snap_match} AND s.state = amvs.state AND s.torrentfile IS NOT NULL
+            )
+        """).rowcount
+
+        # Same state: keep the failure info with more attempts
+        conn.execute(f"""
+            UPDATE main.amvs SET (fail_reason, fail_count, next_retry_at) =
+                (SELECT s.fail_reason, s.fail_count, s.next_retry_at {snap_match})
+            WHERE EXISTS (
+                SELECT 1 {snap_match} AND s.state = amvs.state AND s.fail_count > amvs.fail_count
+            )
+        """)
+
+        option_cols = ", ".join(_common_columns(conn, "download_options"))
+        option_count = conn.execute(
+            f"INSERT OR IGNORE INTO main.download_options ({option_cols}) "
+            f"SELECT {option_cols} FROM snap.download_options"
+        ).rowcount
+
+        # Older snapshots have no metadata table
+        meta_count = 0
+        if conn.execute(
+            "SELECT 1 FROM snap.sqlite_master WHERE type = 'table' AND name = 'amv_meta'"
+        ).fetchone():
+            # meta_id is local to each database
+            meta_cols = ", ".join(
+                col for col in _common_columns(conn, "amv_meta") if col != "meta_id"
+            )
+            meta_count = conn.execute(
+                f"INSERT OR IGNORE INTO main.amv_meta ({meta_cols}) "
+                f"SELECT {meta_cols} FROM snap.amv_meta"
+            ).rowcount
+
+        names = [
+            row[0]
+            for row in conn.execute(
+                "SELECT t.name FROM snap.torrents t "
+                "WHERE t.name IN (SELECT torrentfile FROM main.amvs)"
+            )
+        ]
+        missing = set(names) - torrent_store.existing(names)
+        copied = 0
+        for name in sorted(missing | (winning & set(names))):
+            row = conn.execute(
+                "SELECT data FROM snap.torrents WHERE name = ?", (name,)
+            ).fetchone()
+            if name in missing or torrent_store.read(name) != row[0]:
+                torrent_store.write(name, row[0])
+                copied += 1
+
+    return {
+        "new": new_count,
+        "advanced": advanced_count,
+        "filled": filled_count,
+        "options": option_count,
+        "metadata": meta_count,
+        "torrents": copied,
+    }
+
+
+def iter_merge(paths: Iterable[Path]) -> Iterator[events.Event]:
+    """
+    Merge several snapshots, one after the other (see merge_snapshot).
+
+    Args:
+        paths: Snapshot files created by export_snapshot
+
+    Returns:
+        Iterator over one SnapshotMerged event per file
+
+    Raises:
+        FileNotFoundError: If a snapshot file does not exist (earlier files
+            are merged already)
+    """
+    for path in paths:
+        counts = merge_snapshot(Path(path))
+        yield events.SnapshotMerged(str(path), **counts)
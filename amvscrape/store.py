@@ -0,0 +1,320 @@
+"""Storage backends for downloaded .torrent files.
+
+Torrents are addressed by their file name (``{id}.torrent``, as stored in the
+``torrentfile`` column). Available backends:
+
+- ``flat``: all files in one directory (``torrent-files/{id}.torrent``)
+- ``sharded``: 100 subdirectories by the last two ID digits
+  (``torrent-files/07/12807.torrent``)
+- ``packed``: a single SQLite file with one BLOB per torrent, read through
+  SQLite's memory-mapped I/O (``torrent-files/torrents.sqlite``)
+
+The active backend is selected with ``config.TORRENT_STORE``.
+"""
+
+import json
+import os
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Set
+
+from . import config
+
+
+class TorrentStore(ABC):
+    """Base class for torrent storage backends."""
+
+    kind = ""
+
+    def exists(self, name: str) -> bool:
+        """Check if a torrent is stored."""
+        return name in self.existing([name])
+
+    @abstractmethod
+    def existing(self, names: Iterable[str]) -> Set[str]:
+        """Return the subset of names that are stored (one lookup for all)."""
+
+    @abstractmethod
+    def names(self) -> Iterator[str]:
+        """Iterate over all stored torrent names."""
+
+    @abstractmethod
+    def read(self, name: str) -> bytes:
+        """Read a torrent. Raises KeyError if it is not stored."""
+
+    @abstractmethod
+    def write(self, name: str, data: bytes) -> None:
+        """Store (or replace) a torrent."""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Remove a torrent if stored."""
+
+    @abstractmethod
+    def export(self, name: str) -> Path:
+        """
+        Return a filesystem path to the torrent for handing it to a client.
+
+        Raises KeyError if it is not stored.
+        """
+
+    def close(self) -> None:
+        """Release open resources (the store can still be used afterwards)."""
+
+
+class FlatStore(TorrentStore):
+    """
+    All torrents as files in a single directory.
+
+    existing() lists each directory once per store instance and keeps the
+    listing up to date on write() and delete(); files added by other
+    processes are only seen by a new instance.
+    """
+
+    kind = "flat"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._listings = {}
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def _listing(self, directory: Path) -> Set[str]:
+        # One directory listing instead of a stat() per name
+        if directory not in self._listings:
+            listing = set(os.listdir(directory)) if directory.is_dir() else set()
+            self._listings[directory] = listing
+        return self._listings[directory]
+
+    def existing(self, names: Iterable[str]) -> Set[str]:
+        wanted = set(names)
+        if not wanted:
+            return set()
+        return wanted.intersection(self._listing(self.root))
+
+    def names(self) -> Iterator[str]:
+        if not self.root.is_dir():
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".torrent"):
+                    yield entry.name
+
+    def read(self, name: str) -> bytes:
+        try:
+            return self.path(name).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(name) from None
+
+    def write(self, name: str, data: bytes) -> None:
+        path = self.path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        if path.parent in self._listings:
+            self._listings[path.parent].add(name)
+
+    def delete(self, name: str) -> None:
+        path = self.path(name)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        if path.parent in self._listings:
+            self._listings[path.parent].discard(name)
+
+    def export(self, name: str) -> Path:
+        path = self.path(name)
+        if not path.is_file():
+            raise KeyError(name)
+        return path
+
+
+class ShardedStore(FlatStore):
+    """Torrents spread over subdirectories by the last two digits of the ID."""
+
+    kind = "sharded"
+
+    @staticmethod
+    def shard(name: str) -> str:
+        stem = name.split(".", 1)[0]
+        if re.fullmatch(r"\d+", stem):
+            return f"{int(stem) % 100:02d}"
+        return "xx"
+
+    def path(self, name: str) -> Path:
+        return self.root / self.shard(name) / name
+
+    def existing(self, names: Iterable[str]) -> Set[str]:
+        by_shard = {}
+        for name in names:
+            by_shard.setdefault(self.shard(name), set()).add(name)
+
+        found = set()
+        for shard, wanted in by_shard.items():
+            found.update(wanted.intersection(self._listing(self.root / shard)))
+        return found
+
+    def names(self) -> Iterator[str]:
+        if not self.root.is_dir():
+            return
+        for shard_dir in sorted(self.root.iterdir()):
+            if shard_dir.is_dir() and len(shard_dir.name) == 2:
+                yield from FlatStore(shard_dir).names()
+
+
+class PackedStore(TorrentStore):
+    """
+    All torrents as BLOBs in a single SQLite file.
+
+    The connection is opened on first use and kept until close(), so reading
+    many torrents doesn't set up SQLite (and the memory map) for each one.
+    """
+
+    kind = "packed"
+
+    def __init__(self, path: Path, export_dir: Path):
+        self.path = Path(path)
+        self.export_dir = Path(export_dir)
+        self._conn = None
+
+    def _stored(self) -> bool:
+        # Reads don't create the file
+        return self._conn is not None or self.path.exists()
+
+    @contextmanager
+    def _connect(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            # Read BLOBs through memory-mapped I/O instead of read() calls
+            conn.execute(f"PRAGMA mmap_size = {config.TORRENT_PACK_MMAP_SIZE}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS torrents (
+                    name TEXT PRIMARY KEY,
+                    data BLOB NOT NULL
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        try:
+            yield self._conn
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def existing(self, names: Iterable[str]) -> Set[str]:
+        wanted = list(set(names))
+        if not wanted or not self._stored():
+            return set()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "SELECT name FROM torrents WHERE name IN (SELECT value FROM json_each(?))",
+                (json.dumps(wanted),),
+            )
+            return {row[0] for row in cursor}
+
+    def names(self) -> Iterator[str]:
+        if not self._stored():
+            return
+        with self._connect() as conn:
+            names = [row[0] for row in conn.execute("SELECT name FROM torrents")]
+        yield from names
+
+    def read(self, name: str) -> bytes:
+        row = None
+        if self._stored():
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT data FROM torrents WHERE name = ?", (name,)
+                ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def write(self, name: str, data: bytes) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO torrents (name, data) VALUES (?, ?)",
+                (name, sqlite3.Binary(data)),
+            )
+
+    def delete(self, name: str) -> None:
+        if self._stored():
+            with self._connect() as conn:
+                conn.execute("DELETE FROM torrents WHERE name = ?", (name,))
+
+    def export(self, name: str) -> Path:
+        data = self.read(name)
+        path = self.export_dir / name
+        # Only rewrite if missing or changed (a replaced torrent can have
+        # the same size, so compare the contents; torrents are small)
+        if not path.is_file() or path.read_bytes() != data:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        return path
+
+
+STORE_KINDS = ("flat", "sharded", "packed")
+
+
+def get_store(kind: Optional[str] = None) -> TorrentStore:
+    """
+    Get a torrent store backend.
+
+    Args:
+        kind: "flat", "sharded" or "packed" (default: config.TORRENT_STORE)
+
+    Returns:
+        TorrentStore instance
+    """
+    kind = kind or config.TORRENT_STORE
+    if kind == "flat":
+        return FlatStore(config.TORRENT_DIR)
+    if kind == "sharded":
+        return ShardedStore(config.TORRENT_DIR)
+    if kind == "packed":
+        return PackedStore(config.TORRENT_PACK_PATH, config.TORRENT_EXPORT_DIR)
+    raise ValueError(f"unknown torrent store: '{kind}' (use one of {STORE_KINDS})")
+
+
+def migrate(source: TorrentStore, target: TorrentStore, delete: bool = False) -> int:
+    """
+    Copy all torrents from one store to another.
+
+    Torrents already present in the target with identical content are
+    skipped, so the migration can be re-run after an interruption.
+
+    Args:
+        source: Store to copy from
+        target: Store to copy to
+        delete: Remove each torrent from the source after it was copied and
+            read back successfully
+
+    Returns:
+        Number of torrents copied
+    """
+    names = list(source.names())
+    already = target.existing(names)
+
+    copied = 0
+    for name in names:
+        data = source.read(name)
+        if name not in already or target.read(name) != data:
+            target.write(name, data)
+            if target.read(name) != data:
+                raise IOError(f"verification failed for {name}")
+            copied += 1
+        if delete:
+            source.delete(name)
+
+    return copied
@@ -0,0 +1,353 @@
+"""Verify the local collection against the piece hashes of stored torrents.
+
+Each local file is hashed piece by piece through memory-mapped reads in a
+process pool. Large files are split into several jobs, so one big file keeps
+all cores busy as well. Results are cached in the database together with
+size and mtime of the files, so re-runs only hash files that changed.
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import bencode, config, db, events, store
+
+# 5-digit ID at the start of a file name (same convention as checklib)
+_ID_PATTERN = re.compile(r"^(\d{5})\.")
+
+
+def scan_library(path: Path) -> Tuple[Dict[str, Path], Dict[int, List[Path]]]:
+    """
+    Index all files and directories below the library path.
+
+    Args:
+        path: Library directory
+
+    Returns:
+        (by_name, by_id) - paths by file/directory name, and file paths by
+        the numeric AMV ID at the start of the file name
+    """
+    by_name: Dict[str, Path] = {}
+    by_id: Dict[int, List[Path]] = {}
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            by_name.setdefault(name, Path(dirpath) / name)
+        for name in filenames:
+            match = _ID_PATTERN.match(name)
+            if match:
+                by_id.setdefault(int(match.group(1)), []).append(Path(dirpath) / name)
+
+    return by_name, by_id
+
+
+def locate_files(
+    info: dict, amv_id: str, by_name: Dict[str, Path], by_id: Dict[int, List[Path]]
+) -> List[Optional[Path]]:
+    """
+    Find the local files of a torrent.
+
+    Single-file torrents are matched by the torrent's file name first, then
+    by AMV ID prefix (preferring a file with the expected size). Multi-file
+    torrents are looked up below a directory with the torrent's name.
+
+    Args:
+        info: Torrent metadata from bencode.torrent_info
+        amv_id: AMV ID
+        by_name: Index from scan_library
+        by_id: Index from scan_library
+
+    Returns:
+        One path (or None if missing) per file of the torrent
+    """
+    if info["multi_file"]:
+        root = by_name.get(info["name"])
+        if root is None or not root.is_dir():
+            return [None for _ in info["files"]]
+        return [
+            root / rel_path if (root / rel_path).is_file() else None
+            for rel_path, _ in info["files"]
+        ]
+
+    path = by_name.get(info["name"])
+    if path is not None and path.is_file():
+        return [path]
+
+    candidates = by_id.get(int(amv_id), []) if amv_id.isdigit() else []
+    if not candidates:
+        return [None]
+
+    length = info["total_length"]
+    for candidate in candidates:
+        if candidate.stat().st_size == length:
+            return [candidate]
+    return [candidates[0]]
+
+
+def _files_signature(paths: List[Optional[Path]]) -> str:
+    """Size and mtime of the located files, used as cache key."""
+    entries = []
+    for path in paths:
+        if path is None:
+            entries.append(None)
+        else:
+            st = path.stat()
+            entries.append([str(path), st.st_size, st.st_mtime_ns])
+    return json.dumps(entries)
+
+
+def hash_pieces(
+    files: List[Tuple[Optional[str], int]],
+    piece_length: int,
+    first_piece: int,
+    hashes: List[bytes],
+) -> int:
+    """
+    Check a run of consecutive pieces against their expected hashes.
+
+    Runs in a worker process. Files are read through mmap, pieces that span
+    file boundaries are hashed across files. Pieces touching a missing or
+    too short file count as bad.
+
+    Args:
+        files: (path or None, expected length) for every file of the torrent
+        piece_length: Bytes per piece
+        first_piece: Index of the first piece to check
+        hashes: Expected SHA-1 digests, starting at first_piece
+
+    Returns:
+        Number of matching pieces
+
+    Raises:
+        ValueError: If piece_length is not positive
+    """
+    if piece_length <= 0:
+        raise ValueError(f"piece length must be positive, got {piece_length}")
+
+    offsets = []
+    position = 0
+    for _, length in files:
+        offsets.append(position)
+        position += length
+    total_length = position
+
+    views: Dict[int, Optional[memoryview]] = {}
+    maps = []
+
+    def view(index: int) -> Optional[memoryview]:
+        if index not in views:
+            views[index] = None
+            path = files[index][0]
+            if path is not None:
+                try:
+                    with open(path, "rb") as f:
+                        if os.fstat(f.fileno()).st_size == 0:
+                            views[index] = memoryview(b"")
+                        else:
+                            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                                mm.madvise(mmap.MADV_SEQUENTIAL)
+                            maps.append(mm)
+                            views[index] = memoryview(mm)
+                except OSError:
+                    pass
+        return views[index]
+
+    ok = 0
+    try:
+        for i, expected in enumerate(hashes):
+            start = (first_piece + i) * piece_length
+            end = min(start + piece_length, total_length)
+            digest = hashlib.sha1()
+            complete = True
+
+            index = bisect.bisect_right(offsets, start) - 1
+            while index < len(files) and offsets[index] < end:
+                file_start = offsets[index]
+                a = max(start, file_start) - file_start
+                b = min(end, file_start + files[index][1]) - file_start
+                if b > a:
+                    data = view(index)
+                    if data is None or len(data) < b:
+                        complete = False
+                        break
+                    digest.update(data[a:b])
+                index += 1
+
+            if complete and digest.digest() == expected:
+                ok += 1
+    finally:
+        for data in views.values():
+            if data is not None:
+                data.release()
+        for mm in maps:
+            mm.close()
+
+    return ok
+
+
+def _status(pieces_ok: int, pieces_total: int, found: bool) -> str:
+    if not found:
+        return "missing"
+    if pieces_ok == pieces_total:
+        return "complete"
+    return "partial"
+
+
+def verify_rows(
+    rows: Iterable, library: Path, jobs: Optional[int] = None
+) -> Iterator[tuple]:
+    """
+    Verify the local files of the given AMVs.
+
+    Rows are processed in chunks of config.DB_CHUNK_SIZE; the hashing of
+    each chunk is spread over a process pool.
+
+    Args:
+        rows: AMV rows with torrentfile (e.g. from db.iter_amvs)
+        library: Library directory
+        jobs: Worker processes (default: number of CPUs)
+
+    Returns:
+        Iterator over (row, status, pieces_ok, pieces_total, cached),
+        status is "complete", "partial", "missing", "no torrent" or
+        "invalid torrent" (the stored file is not a valid torrent)
+    """
+    by_name, by_id = scan_library(library)
+    torrent_store = store.get_store()
+    job_bytes = config.VERIFY_JOB_BYTES
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        chunk: List = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= config.DB_CHUNK_SIZE:
+                yield from _verify_chunk(
+                    chunk, executor, torrent_store, by_name, by_id, job_bytes
+                )
+                chunk = []
+        if chunk:
+            yield from _verify_chunk(
+                chunk, executor, torrent_store, by_name, by_id, job_bytes
+            )
+
+
+def _verify_chunk(chunk, executor, torrent_store, by_name, by_id, job_bytes):
+    """Verify one chunk of rows (see verify_rows)."""
+    stored = torrent_store.existing(
+        row["torrentfile"] for row in chunk if row["torrentfile"]
+    )
+    cached = db.get_verify_results([row["id"] for row in chunk])
+
+    results = []
+    pending = []  # (row, info_hash, signature, found, pieces_total, futures)
+
+    for row in chunk:
+        amv_id = row["id"]
+        if row["torrentfile"] not in stored:
+            results.append((row, "no torrent", 0, 0, False))
+            continue
+
+        try:
+            info = bencode.torrent_info(torrent_store.read(row["torrentfile"]))
+        except bencode.BencodeError:
+            results.append((row, "invalid torrent", 0, 0, False))
+            continue
+
+        paths = locate_files(info, amv_id, by_name, by_id)
+        signature = _files_signature(paths)
+        pieces_total = len(info["pieces"])
+        found = any(path is not None for path in paths)
+
+        previous = cached.get(amv_id)
+        if (
+            previous is not None
+            and previous["info_hash"] == info["info_hash"]
+            and previous["files_sig"] == signature
+        ):
+            results.append(
+                (row, previous["status"], previous["pieces_ok"], pieces_total, True)
+            )
+            continue
+
+        futures = []
+        if found:
+            files = [
+                (str(path) if path is not None else None, length)
+                for path, (_, length) in zip(paths, info["files"])
+            ]
+            per_job = max(1, job_bytes // info["piece_length"])
+            for first in range(0, pieces_total, per_job):
+                futures.append(
+                    executor.submit(
+                        hash_pieces,
+                        files,
+                        info["piece_length"],
+                        first,
+                        info["pieces"][first : first + per_job],
+                    )
+                )
+        pending.append((row, info["info_hash"], signature, found, pieces_total, futures))
+
+    new_results = []
+    for row, info_hash, signature, found, pieces_total, futures in pending:
+        pieces_ok = sum(future.result() for future in futures)
+        status = _status(pieces_ok, pieces_total, found)
+        new_results.append(
+            (row["id"], info_hash, signature, status, pieces_ok, pieces_total)
+        )
+        results.append((row, status, pieces_ok, pieces_total, False))
+
+    db.save_verify_results(new_results)
+
+    # Keep the input order
+    order = {row["id"]: i for i, row in enumerate(chunk)}
+    results.sort(key=lambda result: order[result[0]["id"]])
+    yield from results
+
+
+def iter_verify(
+    rows: Iterable, library: Path, jobs: Optional[int] = None
+) -> Iterator[events.Event]:
+    """
+    Verify the given AMVs and mark complete ones as collected (state 3).
+
+    Args:
+        rows: AMV rows with torrentfile (e.g. from db.iter_amvs)
+        library: Library directory
+        jobs: Worker processes (default: number of CPUs)
+
+    Returns:
+        Iterator over events: one Verified per row, then VerifyFinished
+    """
+    counts = dict.fromkeys(
+        ("complete", "partial", "missing", "no torrent", "invalid torrent"), 0
+    )
+    collected_ids = []
+    for row, status, pieces_ok, pieces_total, cached in verify_rows(rows, library, jobs):
+        counts[status] += 1
+        yield events.Verified(
+            row["id"], status, pieces_ok, pieces_total, cached, row["torrentfile"]
+        )
+
+        # Mark complete downloads as collected (state=3), in batches
+        if status == "complete" and row["state"] != 3:
+            collected_ids.append(row["id"])
+            if len(collected_ids) >= config.DB_CHUNK_SIZE:
+                db.transition_states(collected_ids, 3)
+                collected_ids = []
+
+    db.transition_states(collected_ids, 3)
+    yield events.VerifyFinished(
+        counts["complete"],
+        counts["partial"],
+        counts["missing"],
+        counts["no torrent"],
+        counts["invalid torrent"],
+    )
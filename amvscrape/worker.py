@@ -0,0 +1,123 @@
+"""Download workers pulling jobs from the SQLite job queue.
+
+Jobs are added with `amvscrape enqueue`. Any number of `amvscrape worker`
+processes can then run at the same time: each job is claimed atomically with
+a lease, which a heartbeat thread renews while the download runs. If a worker
+crashes, its lease runs out and another worker takes the job over.
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from . import config, db, downloader, events
+
+
+def worker_name() -> str:
+    """Lease owner for this process (host and PID)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _heartbeat(amv_id: str, owner: str, stop: threading.Event) -> None:
+    """Renew the lease of a job until stop is set or the lease is lost (thread)."""
+    while not stop.wait(config.JOB_HEARTBEAT_INTERVAL):
+        if not db.renew_lease(amv_id, owner, config.JOB_LEASE_SECONDS):
+            return
+
+
+def run_job(
+    entry, owner: str, sink: Optional[events.Sink] = None, fast: bool = False
+) -> str:
+    """
+    Download the torrent for a claimed job and record the result.
+
+    Args:
+        entry: Row returned by db.claim_job
+        owner: Worker name the job was claimed with
+        sink: Receives the download result, a Skipped event for AMVs that
+            are downloaded already, and LeaseLost (default: print to stdout)
+        fast: Probe the direct torrent links first (see download_entry_fast)
+
+    Returns:
+        "done", "failed" or "lost" (lease was taken over by another worker,
+        the result was not recorded)
+    """
+    amv_id = entry["id"]
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(amv_id, owner, stop), daemon=True)
+    heartbeat.start()
+
+    sink = sink or events.PrintSink()
+    try:
+        if entry["state"] != 0:
+            # Downloaded in the meantime (e.g. by `amvscrape download`)
+            sink(events.Skipped(amv_id, "already_downloaded"))
+            status, result = "done", "skipped"
+        else:
+            if fast:
+                event = downloader.download_entry_fast(entry)
+            else:
+                event = downloader.download_entry(entry)
+            sink(event)
+            if isinstance(event, events.TorrentSaved):
+                status, result = "done", None
+            else:
+                status, result = "failed", event.reason
+    except KeyboardInterrupt:
+        stop.set()
+        db.finish_job(amv_id, owner, "queued")
+        raise
+    except Exception as e:
+        sink(events.Failure(amv_id, "error", str(e)))
+        status, result = "failed", f"error: {e}"
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    if not db.finish_job(amv_id, owner, status, result):
+        sink(events.LeaseLost(amv_id))
+        return "lost"
+    return status
+
+
+def run_worker(
+    wait: bool = False,
+    limit: Optional[int] = None,
+    sink: Optional[events.Sink] = None,
+    fast: bool = False,
+) -> Dict[str, int]:
+    """
+    Process download jobs until the queue is empty.
+
+    Args:
+        wait: Keep polling for new jobs instead of stopping at an empty queue
+        limit: Maximum number of jobs to process, None for no limit
+        sink: Receives the job events (default: print to stdout, see run_job)
+        fast: Probe the direct torrent links first (see download_entry_fast)
+
+    Returns:
+        Dict with counts for "done", "failed" and "lost" (lease taken over by
+        another worker, result not recorded)
+    """
+    owner = worker_name()
+    counts = {"done": 0, "failed": 0, "lost": 0}
+    processed = 0
+
+    while limit is None or processed < limit:
+        entry = db.claim_job(owner, config.JOB_LEASE_SECONDS, config.JOB_MAX_ATTEMPTS)
+        if entry is None:
+            if not wait:
+                break
+            time.sleep(config.JOB_POLL_INTERVAL)
+            continue
+
+        if processed:
+            # Rate limiting (per worker)
+            time.sleep(config.REQUEST_DELAY)
+
+        counts[run_job(entry, owner, sink, fast)] += 1
+        processed += 1
+
+    return counts
@@ -0,0 +1,16 @@
+"""Shared fixtures: a fresh database and torrent store per test."""
+
+import pytest
+
+from amvscrape import config, db
+
+
+@pytest.fixture
+def amv_db(tmp_path, monkeypatch):
+    """Point amvscrape at an empty database and flat torrent store in tmp_path."""
+    monkeypatch.setattr(config, "DB_PATH", tmp_path / "amv.db")
+    monkeypatch.setattr(config, "TORRENT_DIR", tmp_path / "torrents")
+    monkeypatch.setattr(config, "TORRENT_STORE", "flat")
+    monkeypatch.setattr(config, "REQUEST_DELAY", 0)
+    db.init_db()
+    return tmp_path
@@ -0,0 +1,80 @@
+import hashlib
+
+import pytest
+
+from amvscrape import bencode
+
+from .util import bencode as encode, make_torrent
+
+
+def test_decode():
+    assert bencode.decode(b"d3:bar4:spam3:fooi-42e4:listli1e1:xee") == {
+        b"bar": b"spam",
+        b"foo": -42,
+        b"list": [1, b"x"],
+    }
+
+
+@pytest.mark.parametrize(
+    "data", [b"", b"i12", b"5:abc", b"l1:a", b"d1:ae", b"x", b"i1ei2e", b"ixe"]
+)
+def test_decode_rejects_invalid(data):
+    with pytest.raises(bencode.BencodeError):
+        bencode.decode(data)
+
+
+def test_torrent_info_single_file():
+    content = b"0123456789" * 5
+    data = make_torrent("video.mkv", content, piece_length=16)
+    info = bencode.torrent_info(data)
+
+    raw_info = encode(bencode.decode(data)[b"info"])
+    assert info["info_hash"] == hashlib.sha1(raw_info).hexdigest()
+    assert info["name"] == "video.mkv"
+    assert info["files"] == [("video.mkv", 50)]
+    assert info["total_length"] == 50
+    assert len(info["pieces"]) == 4
+    assert not info["multi_file"]
+
+
+def test_torrent_info_multi_file():
+    data = encode(
+        {
+            "info": {
+                "name": "amv",
+                "piece length": 16,
+                "pieces": b"\0" * 40,
+                "files": [
+                    {"path": ["a.mkv"], "length": 20},
+                    {"path": ["sub", "b.srt"], "length": 5},
+                ],
+            }
+        }
+    )
+    info = bencode.torrent_info(data)
+    assert info["files"] == [("a.mkv", 20), ("sub/b.srt", 5)]
+    assert info["total_length"] == 25
+    assert info["multi_file"]
+
+
+@pytest.mark.parametrize("piece_length", [0, -16, b"16"])
+def test_torrent_info_rejects_bad_piece_length(piece_length):
+    data = encode(
+        {"info": {"name": "a", "length": 1, "piece length": piece_length, "pieces": b""}}
+    )
+    with pytest.raises(bencode.BencodeError):
+        bencode.torrent_info(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"<html>not found</html>",
+        encode({"announce": "x"}),
+        encode({"info": {"name": "a", "length": 1, "piece length": 16, "pieces": b"x"}}),
+        encode({"info": {"name": "a", "length": -1, "piece length": 16, "pieces": b""}}),
+    ],
+)
+def test_torrent_info_rejects_invalid(data):
+    with pytest.raises(bencode.BencodeError):
+        bencode.torrent_info(data)
@@ -0,0 +1,210 @@
+import pytest
+
+from amvscrape import db
+
+
+def _job(amv_id):
+    with db.get_connection() as conn:
+        return conn.execute("SELECT * FROM jobs WHERE amv_id = ?", (amv_id,)).fetchone()
+
+
+def _expire(amv_id):
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE jobs SET lease_expires_at = '2000-01-01T00:00:00.000Z' WHERE amv_id = ?",
+            (amv_id,),
+        )
+
+
+def _queue(*amv_ids):
+    for amv_id in amv_ids:
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    return db.enqueue_jobs()
+
+
+def test_claim_job_in_queue_order(amv_db):
+    assert _queue("1", "2") == 2
+    assert db.claim_job("w1", 60, 3)["id"] == "1"
+    assert db.claim_job("w2", 60, 3)["id"] == "2"
+    assert db.claim_job("w3", 60, 3) is None
+
+
+def test_claim_job_takes_over_expired_lease(amv_db):
+    _queue("1")
+    job = db.claim_job("w1", 60, 3)
+    assert job["attempts"] == 1
+    assert db.claim_job("w2", 60, 3) is None
+
+    _expire("1")
+    job = db.claim_job("w2", 60, 3)
+    assert job["id"] == "1"
+    assert job["attempts"] == 2
+    assert _job("1")["lease_owner"] == "w2"
+
+    # The first worker lost its lease and can't finish or renew the job
+    assert not db.renew_lease("1", "w1", 60)
+    assert not db.finish_job("1", "w1", "done")
+    assert db.finish_job("1", "w2", "done")
+    assert _job("1")["status"] == "done"
+
+
+def test_claim_job_gives_up_after_max_attempts(amv_db):
+    _queue("1", "2")
+    assert db.claim_job("w1", 60, 1)["id"] == "1"
+    _expire("1")
+
+    assert db.claim_job("w2", 60, 1)["id"] == "2"
+    job = _job("1")
+    assert job["status"] == "failed"
+    assert job["result"] == "lease_expired"
+    assert job["lease_owner"] is None
+
+
+def test_enqueue_requeues_finished_jobs_only(amv_db):
+    _queue("1", "2")
+    db.claim_job("w1", 60, 3)
+    db.finish_job("1", "w1", "done")
+
+    assert db.enqueue_jobs() == 1
+    assert _job("1")["status"] == "queued"
+    assert _job("2")["status"] == "queued"
+
+
+def test_iter_amv_chunks_keyset(amv_db):
+    # "7" and "007" have the same numeric ID and sit on a chunk boundary
+    for amv_id in ("1", "2", "3", "5", "6", "7", "007", "8", "10", "11"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    db.transition_states(["2", "7", "007", "10"], 3)
+
+    chunks = list(db.iter_amv_chunks(chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+    ids = [row["id"] for chunk in chunks for row in chunk]
+    assert ids == ["1", "2", "3", "5", "6", "007", "7", "8", "10", "11"]
+
+    rows = db.iter_amv_chunks("state = ?", [3], order="newest", limit=3, chunk_size=2)
+    assert [row["id"] for chunk in rows for row in chunk] == ["10", "7", "007"]
+
+
+def test_iter_amv_chunks_uses_id_index(amv_db):
+    with db.get_connection() as conn:
+        plan = " ".join(
+            row[3]
+            for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM amvs WHERE state = ? "
+                "AND CAST(id AS INTEGER) >= ? AND (CAST(id AS INTEGER), id) > (?, ?) "
+                "ORDER BY CAST(id AS INTEGER), id LIMIT 500",
+                (1, 5, 5, "5"),
+            )
+        )
+    assert "idx_amvs_state_num_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def _log():
+    return [
+        (row["amv_id"], row["old_state"], row["new_state"], row["change"])
+        for row in db.get_changes_since()
+    ]
+
+
+def test_transition_states_logs_changes(amv_db):
+    for amv_id in ("1", "2", "3"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    db.transition_states(["1"], 1)
+
+    # Rows already in the target state are neither changed nor logged
+    assert db.transition_states(["1", "2", "2"], 1) == 1
+    assert _log()[3:] == [("1", 0, 1, "state"), ("2", 0, 1, "state")]
+    assert db.transition_states([], 3) == 0
+
+
+def test_transition_states_rejects_whole_batch(amv_db):
+    for amv_id in ("1", "2"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    db.transition_states(["2"], 3)
+    before = _log()
+
+    # 2 can't go back from 3 to 1, 99 doesn't exist
+    with pytest.raises(db.StateTransitionError, match="not allowed"):
+        db.transition_states(["1", "2"], 1)
+    with pytest.raises(db.StateTransitionError, match="unknown"):
+        db.transition_states(["1", "99"], 1)
+
+    assert db.get_by_id("1")["state"] == 0
+    assert db.get_by_id("2")["state"] == 3
+    assert _log() == before
+
+
+def test_get_changes_since(amv_db):
+    for amv_id in ("1", "2", "3"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    with db.get_connection() as conn:
+        times = ("2024-05-01T10:00:00.000Z", "2024-05-01T12:00:00.000Z", "2024-05-02T00:00:00.000Z")
+        for seq, changed_at in enumerate(times, start=1):
+            conn.execute(
+                "UPDATE state_log SET changed_at = ? WHERE seq = ?", (changed_at, seq)
+            )
+
+    def amv_ids(**kwargs):
+        return [row["amv_id"] for row in db.get_changes_since(**kwargs)]
+
+    assert amv_ids() == ["1", "2", "3"]
+    assert amv_ids(after_seq=1) == ["2", "3"]
+    assert amv_ids(after_seq=3) == []
+    # Other spellings are compared in the stored format, offsets in UTC
+    assert amv_ids(since="2024-05-01T11:00:00Z") == ["2", "3"]
+    assert amv_ids(since="2024-05-01 12:00") == ["3"]
+    assert amv_ids(since="2024-05-01T13:00:00+02:00") == ["2", "3"]
+    assert amv_ids(since="2024-05-01", after_seq=2) == ["3"]
+
+
+@pytest.mark.parametrize("since", ["yesterday", "2024-13-01", ""])
+def test_get_changes_since_rejects_invalid_timestamps(amv_db, since):
+    with pytest.raises(ValueError, match="invalid timestamp"):
+        db.get_changes_since(since=since)
+
+
+@pytest.fixture
+def searchable(amv_db):
+    db.insert_amv("1", "http://example.invalid/?id=1")
+    db.transition_states(["1"], 3)
+    db.save_metadata(
+        "1", {"title": "Rock and Roll", "author": "Kaze", "sources": "Naruto"}
+    )
+    db.save_metadata(
+        "2",
+        {
+            "title": "Naruto Naruto",
+            "author": "Someone",
+            "sources": "Naruto",
+            "tags": "Action",
+        },
+    )
+    db.save_metadata("3", {"title": "Quiet Evening", "tags": "Drama, Romance"})
+
+
+def test_search_ranks_best_match_first(searchable):
+    rows = db.search("naruto")
+    assert [row["amv_id"] for row in rows] == ["2", "1"]
+    assert rows[0]["rank"] < rows[1]["rank"]
+    # State of the AMV, NULL for metadata without an amvs row
+    assert [row["state"] for row in rows] == [None, 3]
+
+    # Plain words must all match, column filters and OR are FTS5 syntax
+    assert [row["amv_id"] for row in db.search("naruto kaze")] == ["1"]
+    rows = db.search("author:kaze OR tags:drama")
+    assert sorted(row["amv_id"] for row in rows) == ["1", "3"]
+    assert len(db.search("naruto", limit=1)) == 1
+
+
+def test_search_falls_back_to_literal_words(searchable):
+    # "AND" at the end is invalid FTS5 syntax: searched as the word "and"
+    assert [row["amv_id"] for row in db.search("rock AND")] == ["1"]
+    assert [row["amv_id"] for row in db.search('roll "')] == ["1"]
+    assert db.search("evening -") == db.search("evening")
+
+
+def test_save_metadata_updates_search_index(searchable):
+    db.save_metadata("3", {"title": "Loud Morning"})
+    assert db.search("evening") == []
+    assert [row["amv_id"] for row in db.search("morning")] == ["3"]
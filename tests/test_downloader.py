@@ -0,0 +1,155 @@
+import pytest
+import requests
+from bs4 import BeautifulSoup
+
+from amvscrape import db, downloader, events, store
+
+from .util import make_torrent
+
+TORRENT = make_torrent("video.mkv", b"x" * 3 * 1048576, piece_length=1048576)
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """Answer fetch_torrent from a dict of URL -> content or exception (default 404)."""
+    answers = {}
+    urls = []
+    not_found = requests.Response()
+    not_found.status_code = 404
+
+    def fetch_torrent(url):
+        urls.append(url)
+        answer = answers.get(url, requests.HTTPError("404", response=not_found))
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer)
+
+    monkeypatch.setattr(downloader, "fetch_torrent", fetch_torrent)
+    monkeypatch.setattr(downloader.time, "sleep", lambda seconds: None)
+    return answers, urls
+
+
+@pytest.mark.parametrize("second", [None, b"<html>no such file</html>"])
+def test_probe_torrent_single_option(fetched, second):
+    answers, urls = fetched
+    answers[downloader.downtorrent_url("7", 0)] = TORRENT
+    if second is not None:
+        answers[downloader.downtorrent_url("7", 1)] = second
+
+    url, data, total_bytes = downloader.probe_torrent("7")
+    assert url == downloader.downtorrent_url("7", 0)
+    assert data == TORRENT
+    assert total_bytes == 3 * 1048576
+    assert urls == [url, downloader.downtorrent_url("7", 1)]
+
+
+@pytest.mark.parametrize(
+    "second",
+    [
+        # Several options: the larger one may be alt=1, let the article decide
+        make_torrent("video-hd.mkv", b"y" * 5 * 1048576, piece_length=1048576),
+        requests.ConnectionError("down"),
+    ],
+)
+def test_probe_torrent_ambiguous(fetched, second):
+    answers, urls = fetched
+    answers[downloader.downtorrent_url("7", 0)] = TORRENT
+    answers[downloader.downtorrent_url("7", 1)] = second
+    assert downloader.probe_torrent("7") is None
+    assert len(urls) == 2
+
+
+@pytest.mark.parametrize(
+    "answer", [b"<html>no such file</html>", requests.ConnectionError("down")]
+)
+def test_probe_torrent_without_torrent(fetched, answer):
+    answers, urls = fetched
+    answers[downloader.downtorrent_url("7", 0)] = answer
+    assert downloader.probe_torrent("7") is None
+    assert len(urls) == 1
+
+
+def test_download_entry_fast_saves_probed_torrent(amv_db, fetched, monkeypatch):
+    answers, _ = fetched
+    answers[downloader.downtorrent_url("7", 0)] = TORRENT
+    monkeypatch.setattr(downloader, "download_entry", pytest.fail)
+    db.insert_amv("7", "http://example.invalid/?id=7")
+
+    event = downloader.download_entry_fast(db.get_by_id("7"))
+    assert event == events.TorrentSaved("7", "7.torrent", 3.0)
+    row = db.get_by_id("7")
+    assert row["state"] == 1
+    assert row["total_bytes"] == 3 * 1048576
+    assert store.get_store().read("7.torrent") == TORRENT
+
+
+def test_download_entry_fast_falls_back_to_article(amv_db, fetched, monkeypatch):
+    calls = []
+    monkeypatch.setattr(downloader.time, "sleep", lambda seconds: calls.append("sleep"))
+    monkeypatch.setattr(
+        downloader, "download_entry", lambda entry: calls.append("article") or "parsed"
+    )
+    db.insert_amv("7", "http://example.invalid/?id=7")
+
+    assert downloader.download_entry_fast(db.get_by_id("7")) == "parsed"
+    # Rate limited between the probe and the article request
+    assert calls == ["sleep", "article"]
+
+
+RUSSIAN_ARTICLE = """
+<html><head>
+<title>AMV News</title>
+<meta property="og:title" content=" Последний рассвет ">
+</head><body>
+<h1>AMV News</h1>
+<div class="content">
+<b>Автор:</b> Kaze <br>
+<b>Аниме:</b> Naruto , Bleach<br>
+<b>Стиль: Action, Drama</b>
+</div>
+</body></html>
+"""
+
+ENGLISH_ARTICLE = """
+<html><head><title> Last Dawn </title></head><body>
+<table>
+<tr><td>Authors:</td><td>Kaze &amp; Someone</td></tr>
+<tr><th>Sources:</th><td>Naruto</td></tr>
+<tr><td>Genre:</td><td></td></tr>
+</table>
+<p><strong>Author:</strong> Ignored</p>
+</body></html>
+"""
+
+
+@pytest.mark.parametrize(
+    "html, meta",
+    [
+        (
+            RUSSIAN_ARTICLE,
+            {
+                "title": "Последний рассвет",
+                "author": "Kaze",
+                "sources": "Naruto, Bleach",
+                "tags": "Action, Drama",
+            },
+        ),
+        # Title from <title>, the first label wins, empty fields are left out
+        (
+            ENGLISH_ARTICLE,
+            {"title": "Last Dawn", "author": "Kaze & Someone", "sources": "Naruto"},
+        ),
+        (
+            "<html><body><h1>Only <i>a</i> title</h1></body></html>",
+            {"title": "Only a title"},
+        ),
+        ("<html><body><p>nothing here</p></body></html>", {}),
+    ],
+)
+def test_extract_metadata(html, meta):
+    assert downloader.extract_metadata(BeautifulSoup(html, "lxml")) == meta
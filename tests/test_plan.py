@@ -0,0 +1,97 @@
+import pytest
+
+from amvscrape import db, events, plan, selection, store
+
+from .util import make_torrent
+
+
+@pytest.fixture
+def sized(amv_db):
+    # 1: no size, 2: article size only, 3: torrent size wins over the article
+    for amv_id in ("1", "2", "3"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    db.set_torrent("1", "1.torrent")
+    db.set_torrent("2", "2.torrent", size_mb=200.0)
+    db.set_torrent("3", "3.torrent", size_mb=100.0, total_bytes=300 * 1048576)
+
+
+def _select(specs):
+    where, params = selection.compile_selection(specs)
+    return sorted(row["id"] for row in db.iter_amvs(where, params))
+
+
+def test_size_filter_uses_torrent_size(sized):
+    # AMV 1 has no size at all and matches neither filter
+    assert _select(["size<250"]) == ["2"]
+    assert _select(["size>250"]) == ["3"]
+
+
+def test_limit_budget_leaves_out_unknown_sizes():
+    rows = [
+        {"id": "1", "size_mb": None, "total_bytes": None},
+        {"id": "2", "size_mb": 300.0, "total_bytes": None},
+        {"id": "3", "size_mb": 100.0, "total_bytes": 600 * 1024 * 1024},
+        {"id": "4", "size_mb": 200.0, "total_bytes": None},
+    ]
+    assert [row["id"] for row in selection.limit_budget(rows, 500)] == ["2", "4"]
+
+
+def test_row_size_mb_uses_torrent_size_even_if_zero():
+    assert selection.row_size_mb({"size_mb": 5.0, "total_bytes": 0}) == 0.0
+    assert selection.row_size_mb({"size_mb": 5.0, "total_bytes": None}) == 5.0
+    assert selection.row_size_mb({"size_mb": None, "total_bytes": None}) is None
+
+
+@pytest.fixture
+def candidates(amv_db):
+    # (ID, MB, resolution): 4 is the newest, 3 has the most pixels per GB
+    for amv_id, size_mb, resolution in [
+        ("1", 400.0, "1280x720"),
+        ("2", 100.0, "640x480"),
+        ("3", 200.0, "1920x1080"),
+        ("4", 250.0, None),
+        ("5", None, "1920x1080"),
+    ]:
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+        db.set_torrent(amv_id, f"{amv_id}.torrent", size_mb, resolution=resolution)
+
+
+@pytest.mark.parametrize(
+    "policy, ids",
+    [
+        ("smallest", ["2", "3"]),
+        ("newest", ["4", "3"]),
+        ("resolution", ["3", "2"]),
+    ],
+)
+def test_plan_rows_policy_order(candidates, policy, ids):
+    rows = plan.plan_rows("state = ?", [1], 450, policy)
+    assert [row["id"] for row in rows] == ids
+
+
+def test_plan_rows_rejects_unknown_policy(amv_db):
+    with pytest.raises(ValueError, match="unknown policy"):
+        plan.plan_rows("1", [], 100, "largest")
+
+
+def test_iter_plan_events(candidates):
+    assert list(plan.iter_plan("state = ?", [1], 450)) == [
+        events.Planned("2", 100.0, "640x480", 100.0),
+        events.Planned("3", 200.0, "1920x1080", 300.0),
+        events.PlanFinished(2, 5, 300.0, 450, 1),
+    ]
+
+
+def test_iter_plan_reads_sizes_from_stored_torrents(candidates):
+    # The stored torrent of AMV 5 is exact: 50 MB makes it the smallest
+    store.get_store().write(
+        "5.torrent", make_torrent("video.mkv", b"x" * 50 * 1048576, 1048576)
+    )
+    plan_events = list(plan.iter_plan("state = ?", [1], 150))
+    assert plan_events == [
+        events.SizesRead(1),
+        events.Planned("5", 50.0, "1920x1080", 50.0),
+        events.Planned("2", 100.0, "640x480", 150.0),
+        events.PlanFinished(2, 5, 150.0, 150, 0),
+    ]
+    assert db.get_by_id("5")["total_bytes"] == 50 * 1048576
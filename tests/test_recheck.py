@@ -0,0 +1,69 @@
+import pytest
+
+from amvscrape import db, downloader
+
+OPTIONS = [
+    ("http://example.invalid/t?alt=0", 100.0, None),
+    ("http://example.invalid/t?alt=1", 300.0, "1920x1080"),
+]
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"ETag": '"v2"'}
+    content = b"<html></html>"
+
+
+@pytest.fixture
+def sent(amv_db, monkeypatch):
+    """AMV 7 with a 100 MB torrent sent to the client; the article now has 300 MB."""
+    downloads = []
+    monkeypatch.setattr(
+        downloader, "fetch_article", lambda url, etag, last_modified: FakeResponse()
+    )
+    monkeypatch.setattr(downloader, "extract_download_options", lambda soup: OPTIONS)
+    monkeypatch.setattr(
+        downloader,
+        "download_torrent",
+        lambda url, amv_id: downloads.append(url) or (f"{amv_id}.torrent", 300 * 1048576),
+    )
+
+    db.insert_amv("7", "http://example.invalid/?id=7")
+    db.set_torrent("7", "7.torrent", size_mb=100.0, total_bytes=100 * 1048576)
+    db.transition_states(["7"], 2)
+    db.record_check("7", "old digest", '"v1"')
+    return downloads
+
+
+def test_recheck_keeps_sent_torrent_without_reopen(sent):
+    event = downloader.recheck_entry(db.get_by_id("7"))
+    assert (event.result, event.old_size_mb, event.size_mb) == ("better", 100.0, 300.0)
+    assert sent == []
+
+    row = db.get_by_id("7")
+    assert row["state"] == 2
+    assert row["total_bytes"] == 100 * 1048576
+    # Found again next time: old digest kept, no conditional request
+    assert row["options_digest"] == "old digest"
+    assert row["etag"] is None
+    assert downloader.recheck_entry(row).result == "better"
+
+
+def test_recheck_with_reopen_replaces_torrent(sent):
+    event = downloader.recheck_entry(db.get_by_id("7"), reopen=True)
+    assert event.result == "upgraded"
+    assert sent == [OPTIONS[1][0]]
+
+    row = db.get_by_id("7")
+    assert row["state"] == 1
+    assert row["size_mb"] == 300.0
+    assert row["resolution"] == "1920x1080"
+    assert row["options_digest"] == downloader.options_digest(OPTIONS)
+
+
+def test_recheck_replaces_unsent_torrent(sent):
+    with db.get_connection() as conn:
+        conn.execute("UPDATE amvs SET state = 1 WHERE id = '7'")
+
+    assert downloader.recheck_entry(db.get_by_id("7")).result == "upgraded"
+    assert db.get_by_id("7")["state"] == 1
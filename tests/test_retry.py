@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from amvscrape import config, db
+
+
+def _retry_in(amv_id) -> timedelta:
+    value = db.get_by_id(amv_id)["next_retry_at"]
+    retry_at = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
+    return retry_at.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+
+
+def _pending():
+    return [row["id"] for row in db.get_pending_downloads()]
+
+
+@pytest.fixture
+def amvs(amv_db):
+    for amv_id in ("1", "2", "3"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+
+
+def test_retry_delay_doubles(amvs):
+    db.record_failure("1", "fetch_error")
+    assert abs(_retry_in("1") - timedelta(hours=1)) < timedelta(minutes=1)
+
+    db.record_failure("1", "fetch_error")
+    row = db.get_by_id("1")
+    assert (row["fail_reason"], row["fail_count"]) == ("fetch_error", 2)
+    assert abs(_retry_in("1") - timedelta(hours=2)) < timedelta(minutes=1)
+
+
+def test_retry_delay_is_capped(amvs):
+    for _ in range(40):
+        db.record_failure("1", "torrent_error")
+    max_delay = timedelta(seconds=config.RETRY_MAX_DELAY)
+    assert abs(_retry_in("1") - max_delay) < timedelta(minutes=1)
+
+
+def test_deferred_rows_are_skipped_until_due(amvs):
+    db.record_failure("1", "fetch_error")
+    db.record_failure("1", "fetch_error")
+    assert _pending() == ["2", "3"]
+    assert db.count_pending_downloads() == 2
+    assert db.count_deferred_downloads() == 1
+
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE amvs SET next_retry_at = '2000-01-01T00:00:00.000Z' WHERE id = '1'"
+        )
+    assert _pending() == ["1", "2", "3"]
+    assert db.count_deferred_downloads() == 0
+
+
+def test_no_torrent_is_never_due(amvs):
+    db.record_failure("2", "no_torrent")
+    row = db.get_by_id("2")
+    assert row["fail_reason"] == "no_torrent"
+    assert row["next_retry_at"] is None
+    assert _pending() == ["1", "3"]
+    # Counted as skipped, and never due however much time passes
+    assert db.count_deferred_downloads() == 1
+    with db.get_connection() as conn:
+        conn.execute("UPDATE amvs SET next_retry_at = '2000-01-01T00:00:00.000Z'")
+    assert _pending() == ["1", "3"]
+
+
+def test_set_torrent_clears_failures(amvs):
+    db.record_failure("1", "torrent_error")
+    db.set_torrent("1", "1.torrent", size_mb=10.0)
+
+    row = db.get_by_id("1")
+    assert row["state"] == 1
+    assert (row["fail_reason"], row["fail_count"], row["next_retry_at"]) == (None, 0, None)
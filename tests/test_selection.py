@@ -0,0 +1,68 @@
+import pytest
+
+from amvscrape import db, selection
+
+
+@pytest.mark.parametrize(
+    "term, expected",
+    [
+        ("12345", (False, ("id", 12345))),
+        ("007", (False, ("id", 7))),
+        ("!8000-8100", (True, ("range", 8000, 8100))),
+        (">9000", (False, ("gt", 9000))),
+        ("state=0|1", (False, ("state", [0, 1]))),
+        ("size<1.5G", (False, ("size", "<", 1536.0))),
+        ("shard=2/4", (False, ("shard", 2, 4))),
+    ],
+)
+def test_parse_term(term, expected):
+    assert selection.parse_term(term) == expected
+
+
+@pytest.mark.parametrize(
+    "term",
+    ["²", "12a", "9-1", "state=", "state=7", "state=1|4", "size<x", "shard=5/4", "foo"],
+)
+def test_parse_term_rejects_invalid(term):
+    with pytest.raises(selection.SelectionError):
+        selection.parse_term(term)
+
+
+@pytest.mark.parametrize("text", ["1/0", "0/3", "1/²", "a/b", "1"])
+def test_parse_shard_rejects_invalid(text):
+    with pytest.raises(selection.SelectionError):
+        selection.parse_shard(text)
+
+
+def test_explicit_ids():
+    assert selection.explicit_ids(["5,!6", "8000-9000", "0012"]) == [5, 12]
+
+
+def _select(specs, default_state=None):
+    where, params = selection.compile_selection(specs, default_state)
+    return sorted(row["id"] for row in db.iter_amvs(where, params))
+
+
+@pytest.fixture
+def amvs(amv_db):
+    for amv_id, state in [("1", 0), ("02", 1), ("3", 1), ("10", 2), ("11", 3)]:
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+        if state:
+            db.set_torrent(amv_id, f"{amv_id}.torrent", size_mb=int(amv_id) * 100.0)
+            if state > 1:
+                db.transition_states([amv_id], 2)
+            if state > 2:
+                db.transition_states([amv_id], 3)
+
+
+def test_compile_selection(amvs):
+    # Explicit IDs ignore the default state, ranges don't
+    assert _select(["2", "10-11"], default_state=1) == ["02"]
+    # An explicit state filter applies to everything
+    assert _select(["2", "10-11", "state=2|3"], default_state=1) == ["10", "11"]
+    assert _select(["!state=3", "!1"]) == ["02", "10", "3"]
+    assert _select([], default_state=1) == ["02", "3"]
+
+
+def test_find_missing_ids(amvs):
+    assert db.find_missing_ids([2, 4, 10, 99]) == [4, 99]
@@ -0,0 +1,78 @@
+import pytest
+
+from amvscrape import config, db, snapshot, store
+
+
+@pytest.fixture
+def remote_snapshot(amv_db, monkeypatch):
+    """Export a snapshot from a second node, then switch back to the local one."""
+    local_db, local_torrents = config.DB_PATH, config.TORRENT_DIR
+    monkeypatch.setattr(config, "DB_PATH", amv_db / "remote.db")
+    monkeypatch.setattr(config, "TORRENT_DIR", amv_db / "remote-torrents")
+    db.init_db()
+
+    for amv_id in ("1", "2", "3", "4"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    # 1: further along remotely, but without a size
+    torrent_store = store.get_store()
+    torrent_store.write("1.torrent", b"remote 1")
+    db.set_torrent("1", "1.torrent", resolution="1920x1080")
+    db.transition_states(["1"], 2)
+    # 2: same state remotely, with a torrent
+    torrent_store.write("2.torrent", b"remote 2")
+    db.set_torrent("2", "2.torrent", size_mb=20.0)
+    db.transition_states(["2"], 2)
+    # 3: behind remotely; 4: unknown locally
+    torrent_store.write("4.torrent", b"remote 4")
+    db.set_torrent("4", "4.torrent", size_mb=40.0)
+
+    path = amv_db / "snapshot.sqlite"
+    snapshot.export_snapshot(path)
+
+    monkeypatch.setattr(config, "DB_PATH", local_db)
+    monkeypatch.setattr(config, "TORRENT_DIR", local_torrents)
+    return path
+
+
+def test_merge_snapshot(remote_snapshot):
+    torrent_store = store.get_store()
+    for amv_id in ("1", "2", "3"):
+        db.insert_amv(amv_id, f"http://example.invalid/?id={amv_id}")
+    torrent_store.write("1.torrent", b"local 1")
+    db.set_torrent("1", "1.torrent", size_mb=10.0, total_bytes=10 * 1048576)
+    db.transition_states(["2"], 1)
+    db.transition_states(["2"], 2)
+    db.transition_states(["3"], 3)
+
+    counts = snapshot.merge_snapshot(remote_snapshot)
+    assert counts["new"] == 1
+    assert counts["advanced"] == 1
+    assert counts["filled"] == 1
+
+    # The winning row keeps known values where the snapshot has none...
+    row = db.get_by_id("1")
+    assert row["state"] == 2
+    assert row["size_mb"] == 10.0
+    assert row["resolution"] == "1920x1080"
+    # ...but its torrent file replaces the local one
+    assert torrent_store.read("1.torrent") == b"remote 1"
+
+    assert db.get_by_id("2")["torrentfile"] == "2.torrent"
+    assert torrent_store.read("2.torrent") == b"remote 2"
+    assert db.get_by_id("3")["state"] == 3
+    assert db.get_by_id("4")["state"] == 1
+    assert torrent_store.read("4.torrent") == b"remote 4"
+
+
+def test_merge_snapshot_is_idempotent(remote_snapshot):
+    snapshot.merge_snapshot(remote_snapshot)
+    changes = len(db.get_changes_since())
+
+    counts = snapshot.merge_snapshot(remote_snapshot)
+    assert counts == dict.fromkeys(counts, 0)
+    assert len(db.get_changes_since()) == changes
+
+
+def test_merge_snapshot_missing_file(amv_db):
+    with pytest.raises(FileNotFoundError):
+        snapshot.merge_snapshot(amv_db / "missing.sqlite")
@@ -0,0 +1,92 @@
+from itertools import permutations
+
+import pytest
+
+from amvscrape import store
+
+TORRENTS = {
+    "7.torrent": b"d4:infod4:name1:7ee",
+    "12807.torrent": b"d4:infod4:name5:12807ee",
+    "abc.torrent": b"d4:infod4:name3:abcee",
+}
+
+
+def _make(kind, root):
+    if kind == "flat":
+        return store.FlatStore(root / "flat")
+    if kind == "sharded":
+        return store.ShardedStore(root / "sharded")
+    return store.PackedStore(root / "torrents.sqlite", root / "export")
+
+
+@pytest.mark.parametrize(
+    "source_kind, target_kind", list(permutations(store.STORE_KINDS, 2))
+)
+def test_migrate(tmp_path, source_kind, target_kind):
+    source = _make(source_kind, tmp_path)
+    target = _make(target_kind, tmp_path)
+    for name, data in TORRENTS.items():
+        source.write(name, data)
+    # Already copied with the same content, or with different content
+    target.write("7.torrent", TORRENTS["7.torrent"])
+    target.write("abc.torrent", b"old")
+
+    assert store.migrate(source, target) == 2
+    assert sorted(target.names()) == sorted(TORRENTS)
+    assert {name: target.read(name) for name in TORRENTS} == TORRENTS
+    # Re-running copies nothing
+    assert store.migrate(source, target) == 0
+
+    assert store.migrate(source, target, delete=True) == 0
+    assert list(source.names()) == []
+    assert source.existing(TORRENTS) == set()
+    assert target.existing(TORRENTS) == set(TORRENTS)
+
+
+def test_sharded_layout(tmp_path):
+    sharded = _make("sharded", tmp_path)
+    for name, data in TORRENTS.items():
+        sharded.write(name, data)
+    assert (tmp_path / "sharded" / "07" / "12807.torrent").is_file()
+    assert (tmp_path / "sharded" / "07" / "7.torrent").is_file()
+    assert (tmp_path / "sharded" / "xx" / "abc.torrent").is_file()
+
+
+@pytest.mark.parametrize("kind", ["flat", "sharded"])
+def test_existing_lists_directories_once(tmp_path, monkeypatch, kind):
+    files = _make(kind, tmp_path)
+    files.write("7.torrent", TORRENTS["7.torrent"])
+    listed = []
+    listdir = store.os.listdir
+    monkeypatch.setattr(
+        store.os, "listdir", lambda path: listed.append(path) or listdir(path)
+    )
+
+    for _ in range(3):
+        assert files.existing(["7.torrent", "8.torrent"]) == {"7.torrent"}
+    assert len(listed) == 1
+
+    # Kept up to date by the instance's own writes and deletes
+    files.write("8.torrent", b"8")
+    files.delete("7.torrent")
+    assert files.existing(["7.torrent", "8.torrent"]) == {"8.torrent"}
+    assert len(listed) == 1
+
+
+def test_packed_reuses_connection(tmp_path):
+    packed = _make("packed", tmp_path)
+    # Reads don't create the file
+    with pytest.raises(KeyError):
+        packed.read("7.torrent")
+    assert not packed.path.exists()
+
+    packed.write("7.torrent", TORRENTS["7.torrent"])
+    conn = packed._conn
+    assert packed.read("7.torrent") == TORRENTS["7.torrent"]
+    assert packed.existing(TORRENTS) == {"7.torrent"}
+    assert packed._conn is conn
+
+    packed.close()
+    assert packed.read("7.torrent") == TORRENTS["7.torrent"]
+    assert packed.export("7.torrent").read_bytes() == TORRENTS["7.torrent"]
+    packed.close()
@@ -0,0 +1,55 @@
+import pytest
+
+from amvscrape import verify
+
+from .util import piece_hashes
+
+
+def _pieces(content, piece_length):
+    raw = piece_hashes(content, piece_length)
+    return [raw[i : i + 20] for i in range(0, len(raw), 20)]
+
+
+def test_hash_pieces_across_files(tmp_path):
+    first, second = b"a" * 20, b"b" * 13
+    (tmp_path / "a").write_bytes(first)
+    (tmp_path / "b").write_bytes(second)
+    files = [(str(tmp_path / "a"), 20), (str(tmp_path / "b"), 13)]
+    hashes = _pieces(first + second, 8)
+
+    assert verify.hash_pieces(files, 8, 0, hashes) == 5
+    # A run starting in the middle of the torrent
+    assert verify.hash_pieces(files, 8, 2, hashes[2:]) == 3
+
+
+def test_hash_pieces_missing_and_short_files(tmp_path):
+    first, second = b"a" * 20, b"b" * 13
+    (tmp_path / "a").write_bytes(first)
+    (tmp_path / "b").write_bytes(second[:5])
+    hashes = _pieces(first + second, 8)
+
+    # Piece 2 spans into the short file but ends before its end, 3-4 don't
+    short = [(str(tmp_path / "a"), 20), (str(tmp_path / "b"), 13)]
+    assert verify.hash_pieces(short, 8, 0, hashes) == 3
+    missing = [(None, 20), (str(tmp_path / "b"), 13)]
+    assert verify.hash_pieces(missing, 8, 0, hashes) == 0
+
+
+def test_hash_pieces_detects_corruption(tmp_path):
+    content = b"0123456789abcdef" * 2
+    (tmp_path / "a").write_bytes(content[:-1] + b"X")
+    files = [(str(tmp_path / "a"), len(content))]
+    assert verify.hash_pieces(files, 16, 0, _pieces(content, 16)) == 1
+
+
+def test_hash_pieces_empty_file(tmp_path):
+    (tmp_path / "empty").write_bytes(b"")
+    (tmp_path / "a").write_bytes(b"abc")
+    files = [(str(tmp_path / "empty"), 0), (str(tmp_path / "a"), 3)]
+    assert verify.hash_pieces(files, 4, 0, _pieces(b"abc", 4)) == 1
+
+
+@pytest.mark.parametrize("piece_length", [0, -1])
+def test_hash_pieces_rejects_bad_piece_length(piece_length):
+    with pytest.raises(ValueError):
+        verify.hash_pieces([(None, 10)], piece_length, 0, [b"\0" * 20])
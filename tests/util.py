@@ -0,0 +1,42 @@
+"""Helpers for building test torrents."""
+
+import hashlib
+
+
+def bencode(value) -> bytes:
+    """Encode a value for test torrents (amvscrape itself only decodes)."""
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(item) for item in value) + b"e"
+    if isinstance(value, dict):
+        items = sorted((k.encode() if isinstance(k, str) else k, v) for k, v in value.items())
+        return b"d" + b"".join(bencode(k) + bencode(v) for k, v in items) + b"e"
+    raise TypeError(f"can't bencode {type(value).__name__}")
+
+
+def piece_hashes(content: bytes, piece_length: int) -> bytes:
+    """Concatenated SHA-1 digests of the pieces of some content."""
+    return b"".join(
+        hashlib.sha1(content[i : i + piece_length]).digest()
+        for i in range(0, len(content), piece_length)
+    )
+
+
+def make_torrent(name: str, content: bytes, piece_length: int = 16) -> bytes:
+    """Build a single-file torrent for the given file content."""
+    return bencode(
+        {
+            "announce": "http://tracker.invalid/announce",
+            "info": {
+                "name": name,
+                "length": len(content),
+                "piece length": piece_length,
+                "pieces": piece_hashes(content, piece_length),
+            },
+        }
+    )